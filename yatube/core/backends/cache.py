@@ -0,0 +1,355 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+    'expires REAL, accessed REAL NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed_idx ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    'name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID',
+    # Число записей и их размер ведут триггеры в той же транзакции,
+    # что и запись, поэтому проверка лимитов не пересчитывает таблицу.
+    'CREATE TABLE IF NOT EXISTS cache_size ('
+    'id INTEGER PRIMARY KEY CHECK (id = 1), entries INTEGER NOT NULL, '
+    'bytes INTEGER NOT NULL)',
+    'CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache '
+    'BEGIN UPDATE cache_size SET entries = entries + 1, '
+    'bytes = bytes + new.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache '
+    'BEGIN UPDATE cache_size SET entries = entries - 1, '
+    'bytes = bytes - old.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_size_update AFTER UPDATE OF size '
+    'ON cache BEGIN UPDATE cache_size SET '
+    'bytes = bytes + new.size - old.size; END',
+    'INSERT OR IGNORE INTO cache_size '
+    'SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM cache',
+)
+ALIVE = '(expires IS NULL OR expires > ?)'
+STATS = ('hits', 'misses', 'evictions')
+BUSY_TIMEOUT = 5
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite, общий для всех процессов сервера.
+
+    LOCATION — путь к файлу. Кроме MAX_ENTRIES и CULL_FREQUENCY из
+    BaseCache в OPTIONS понимает:
+    MAX_BYTES — предел суммарного размера значений;
+    MMAP_SIZE — сколько байт файла читать через mmap;
+    ACCESS_RESOLUTION — время доступа для LRU обновляется не чаще,
+    чем раз в столько секунд, чтобы чтение не превращалось в запись;
+    STATS_FLUSH_EVERY — через сколько обращений сбрасывать счётчики
+    попаданий и промахов процесса в общую таблицу.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.max_bytes = options.get('MAX_BYTES')
+        self.mmap_size = options.get('MMAP_SIZE', 64 * 2 ** 20)
+        self.access_resolution = options.get('ACCESS_RESOLUTION', 60)
+        self.stats_flush_every = options.get('STATS_FLUSH_EVERY', 100)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._pending = dict.fromkeys(STATS, 0)
+        self._pending_total = 0
+
+    @property
+    def _db(self):
+        # sqlite3-соединение нельзя делить между потоками.
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self.location, timeout=BUSY_TIMEOUT, isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode = wal')
+            db.execute('PRAGMA synchronous = normal')
+            db.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+            with _Transaction(db):
+                for statement in SCHEMA:
+                    db.execute(statement)
+            self._local.db = db
+        return db
+
+    def _write(self):
+        return _Transaction(self._db)
+
+    def _write_if_free(self, statement, params_seq):
+        """Выполняет необязательную запись, только если база свободна.
+
+        Ради счётчиков и времени доступа чтение не ждёт чужую
+        транзакцию. Возвращает False, если база занята.
+        """
+        db = self._db
+        db.execute('PRAGMA busy_timeout = 0')
+        try:
+            with _Transaction(db):
+                db.executemany(statement, params_seq)
+        except sqlite3.OperationalError:
+            return False
+        finally:
+            db.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}')
+        return True
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._pending[name] += amount
+            self._pending_total += amount
+            flush = self._pending_total >= self.stats_flush_every
+        if flush:
+            self._flush_stats(wait=False)
+
+    def _flush_stats(self, wait=True):
+        with self._stats_lock:
+            pending = {
+                name: value for name, value in self._pending.items() if value
+            }
+            self._pending = dict.fromkeys(STATS, 0)
+            self._pending_total = 0
+        if not pending:
+            return
+        statement = (
+            'INSERT INTO cache_stats VALUES (?, ?) ON CONFLICT (name) '
+            'DO UPDATE SET value = value + excluded.value'
+        )
+        if wait:
+            with self._write() as db:
+                db.executemany(statement, pending.items())
+        elif not self._write_if_free(statement, pending.items()):
+            # Не удалось — счётчики уйдут со следующим сбросом.
+            with self._stats_lock:
+                for name, value in pending.items():
+                    self._pending[name] += value
+                    self._pending_total += value
+
+    def _touch_rows(self, keys, now):
+        # Приблизительный LRU: свежим ключам время доступа не обновляем.
+        # Если база занята, время доступа обновит следующее чтение.
+        self._write_if_free(
+            'UPDATE cache SET accessed = ? WHERE accessed < ? AND key IN '
+            f'({", ".join("?" * len(keys))})',
+            [[now, now - self.access_resolution, *keys]],
+        )
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        names = {}
+        for key in keys:
+            name = self.make_key(key, version=version)
+            self.validate_key(name)
+            names[name] = key
+        now = time.time()
+        rows = self._db.execute(
+            'SELECT key, value, accessed FROM cache WHERE key IN '
+            f'({", ".join("?" * len(names))}) AND {ALIVE}',
+            [*names, now],
+        ).fetchall()
+        stale = [
+            name for name, _, accessed in rows
+            if accessed < now - self.access_resolution
+        ]
+        if stale:
+            self._touch_rows(stale, now)
+        self._count('hits', len(rows))
+        if len(names) > len(rows):
+            self._count('misses', len(names) - len(rows))
+        return {names[name]: pickle.loads(value) for name, value, _ in rows}
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._db.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            [key, time.time()],
+        ).fetchone() is not None
+
+    def _rows(self, data, timeout, version):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            rows.append((key, value, len(value), expires, now))
+        return rows
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = self._rows(data, timeout, version)
+        if not rows:
+            return []
+        with self._write() as db:
+            # Не INSERT OR REPLACE: удаление при замене не запускает
+            # триггеры, и cache_size разошёлся бы с таблицей.
+            db.executemany(
+                'INSERT INTO cache VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) '
+                'DO UPDATE SET value = excluded.value, size = excluded.size, '
+                'expires = excluded.expires, accessed = excluded.accessed',
+                rows,
+            )
+            self._cull(db)
+        return []
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        (row,) = self._rows({key: value}, timeout, version)
+        with self._write() as db:
+            added = db.execute(
+                'INSERT INTO cache VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) '
+                'DO UPDATE SET value = excluded.value, size = excluded.size, '
+                'expires = excluded.expires, accessed = excluded.accessed '
+                'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                [*row, time.time()],
+            ).rowcount
+            self._cull(db)
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            return bool(db.execute(
+                f'UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}',
+                [self.get_backend_timeout(timeout), key, time.time()],
+            ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        # BaseCache.incr делает get и set без блокировки: два процесса
+        # потеряли бы одно из увеличений версии ленты.
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            row = db.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {ALIVE}',
+                [key, time.time()],
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                [pickled, len(pickled), key],
+            )
+        return value
+
+    def delete_many(self, keys, version=None):
+        names = [self.make_key(key, version=version) for key in keys]
+        for name in names:
+            self.validate_key(name)
+        if not names:
+            return
+        with self._write() as db:
+            db.execute(
+                'DELETE FROM cache WHERE key IN '
+                f'({", ".join("?" * len(names))})',
+                names,
+            )
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def clear(self):
+        with self._write() as db:
+            db.execute('DELETE FROM cache')
+
+    def _size(self, db):
+        return db.execute(
+            'SELECT entries, bytes FROM cache_size'
+        ).fetchone()
+
+    def _cull(self, db):
+        entries, size = self._size(db)
+        over_entries = entries > self._max_entries
+        over_bytes = self.max_bytes is not None and size > self.max_bytes
+        if not over_entries and not over_bytes:
+            return
+        db.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            [time.time()],
+        )
+        evicted = 0
+        if over_entries:
+            # Как и встроенные кеши, вытесняем с запасом, чтобы не
+            # чистить на каждой записи.
+            limit = self._max_entries - (
+                self._max_entries // self._cull_frequency
+                if self._cull_frequency else self._max_entries
+            )
+            entries, _ = self._size(db)
+            evicted += db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)',
+                [max(0, entries - limit)],
+            ).rowcount
+        if self.max_bytes is not None:
+            # Удаляем самые давние записи, пока суммарный размер
+            # остальных больше предела.
+            evicted += db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM ('
+                'SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key) '
+                'AS total FROM cache) WHERE total > ?)',
+                [self.max_bytes],
+            ).rowcount
+        if evicted:
+            # Уже внутри транзакции, поэтому пишем сразу, а не через
+            # счётчики процесса.
+            db.execute(
+                "INSERT INTO cache_stats VALUES ('evictions', ?) "
+                'ON CONFLICT (name) DO UPDATE SET value = value + ?',
+                [evicted, evicted],
+            )
+
+    def stats(self):
+        """Попадания, промахи и вытеснения всех процессов плюс размер."""
+        self._flush_stats()
+        result = dict.fromkeys(STATS, 0)
+        result.update(self._db.execute(
+            'SELECT name, value FROM cache_stats'
+        ).fetchall())
+        result['entries'], result['bytes'] = self._size(self._db)
+        return result
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._pending = dict.fromkeys(STATS, 0)
+            self._pending_total = 0
+        with self._write() as db:
+            db.execute('DELETE FROM cache_stats')
+
+    def close(self, **kwargs):
+        # Django закрывает кеши после каждого запроса, а соединение
+        # с файлом выгодно держать открытым, как и CONN_MAX_AGE у базы.
+        pass
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE … COMMIT: писатели ждут друг друга по timeout."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
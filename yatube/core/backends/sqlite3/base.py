@@ -0,0 +1,37 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite с PRAGMA из настроек и BEGIN IMMEDIATE для транзакций.
+
+    В OPTIONS, кроме параметров sqlite3.connect, понимает:
+    pragmas — словарь PRAGMA, которые выполняются на каждом новом
+    соединении (journal_mode, synchronous, mmap_size и т.п.);
+    transaction_mode — DEFERRED, IMMEDIATE или EXCLUSIVE для
+    transaction.atomic().
+    """
+
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', {})
+        self.transaction_mode = options.get('transaction_mode')
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # Отложенный BEGIN берёт блокировку на запись только на первом
+        # INSERT/UPDATE, и если в это время пишет кто-то ещё, SQLite сразу
+        # отвечает «database is locked», не дожидаясь busy_timeout.
+        # BEGIN IMMEDIATE встаёт в очередь писателей в самом начале.
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
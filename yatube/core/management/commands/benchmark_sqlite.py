@@ -0,0 +1,140 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'text TEXT, pub_date REAL, comments_count INTEGER DEFAULT 0)',
+    'CREATE INDEX post_date_idx ON post (pub_date DESC, id DESC)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER, '
+    'author_id INTEGER, text TEXT, created REAL)',
+    'CREATE INDEX comment_post_idx ON comment (post_id, created DESC)',
+)
+LISTING = 'SELECT * FROM post ORDER BY pub_date DESC, id DESC LIMIT 11'
+COMMENTS = (
+    'SELECT * FROM comment WHERE post_id = %s '
+    'ORDER BY created DESC LIMIT 20'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест SQLite: параллельные чтения ленты и запись '
+        'комментариев со стандартным бэкендом и с настроенным из '
+        'DATABASES["default"]. Базы создаются во временном каталоге.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--posts', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        tuned = settings.DATABASES['default']
+        modes = {
+            'default': {'ENGINE': 'django.db.backends.sqlite3'},
+            'tuned': {
+                'ENGINE': tuned['ENGINE'],
+                'OPTIONS': tuned.get('OPTIONS', {}),
+            },
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for mode, database in modes.items():
+                alias = f'benchmark_{mode}'
+                connections.databases[alias] = dict(
+                    database, NAME=os.path.join(directory, f'{mode}.sqlite3')
+                )
+                connections.ensure_defaults(alias)
+                self.prepare(alias, options['posts'])
+                reads, writes, errors = self.run(alias, options)
+                seconds = options['seconds']
+                self.stdout.write(
+                    f'{mode:<10}{reads / seconds:>10.0f} чтений/с'
+                    f'{writes / seconds:>10.0f} записей/с'
+                    f'{errors:>8} ошибок «database is locked»'
+                )
+                connections[alias].close()
+                del connections.databases[alias]
+
+    def prepare(self, alias, posts):
+        with connections[alias].cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            now = time.time()
+            cursor.executemany(
+                'INSERT INTO post (author_id, text, pub_date) '
+                'VALUES (%s, %s, %s)',
+                [(number % 100, 'пост ' * 50, now - number)
+                 for number in range(posts)],
+            )
+
+    def run(self, alias, options):
+        stop = time.monotonic() + options['seconds']
+        totals = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(write):
+            rng = random.Random()
+            done = errors = 0
+            connection = connections[alias]
+            try:
+                while time.monotonic() < stop:
+                    post_id = rng.randint(1, options['posts'])
+                    try:
+                        if write:
+                            self.write(alias, post_id)
+                        else:
+                            self.read(alias, post_id)
+                        done += 1
+                    except OperationalError:
+                        errors += 1
+            finally:
+                connection.close()
+            with lock:
+                totals['writes' if write else 'reads'] += done
+                totals['errors'] += errors
+
+        threads = [
+            threading.Thread(target=worker, args=(False,))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=(True,))
+            for _ in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return totals['reads'], totals['writes'], totals['errors']
+
+    def read(self, alias, post_id):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LISTING)
+            cursor.fetchall()
+            cursor.execute(COMMENTS, [post_id])
+            cursor.fetchall()
+
+    def write(self, alias, post_id):
+        # Как add_comment: сначала читаем пост, потом пишем комментарий
+        # и счётчик в одной транзакции.
+        with transaction.atomic(using=alias):
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT id FROM post WHERE id = %s', [post_id])
+                cursor.fetchone()
+                cursor.execute(
+                    'INSERT INTO comment (post_id, author_id, text, created) '
+                    'VALUES (%s, %s, %s, %s)',
+                    [post_id, 1, 'комментарий', time.time()],
+                )
+                cursor.execute(
+                    'UPDATE post SET comments_count = comments_count + 1 '
+                    'WHERE id = %s',
+                    [post_id],
+                )
@@ -0,0 +1,29 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Попадания, промахи и вытеснения общего кеша (SQLiteCache).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default')
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить счётчики.'
+        )
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not hasattr(cache, 'stats'):
+            raise CommandError(
+                f'Кеш {options["alias"]} не ведёт статистику'
+            )
+        stats = cache.stats()
+        requests = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / requests if requests else 0
+        self.stdout.write(
+            f'попаданий {stats["hits"]}, промахов {stats["misses"]} '
+            f'({ratio:.1%}), вытеснено {stats["evictions"]}, '
+            f'записей {stats["entries"]}, {stats["bytes"]} байт'
+        )
+        if options['reset']:
+            cache.reset_stats()
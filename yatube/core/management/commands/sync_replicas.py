@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует SQLite-базу default в файлы реплик из DATABASE_REPLICAS. '
+        'С --interval повторяет копирование, изображая отстающие реплики.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Секунды между копиями; без параметра копирует один раз.',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                'Реплик нет: задайте YATUBE_DB_REPLICAS в окружении'
+            )
+        while True:
+            self.sync()
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def sync(self):
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    # backup() даёт согласованный снимок даже во время
+                    # записи в default и не мешает читателям реплики.
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'{alias}: скопирована')
+        finally:
+            source.close()
@@ -0,0 +1,114 @@
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_state = threading.local()
+# Сессия и пользователь нужны на каждой странице: отставшая реплика
+# разлогинила бы пользователя сразу после входа или отдала бы старый хеш
+# пароля после его смены, и get_user сбросил бы сессию. Типы содержимого
+# кешируются в процессе, и устаревшая запись из реплики жила бы в нём
+# до перезапуска.
+PRIMARY_ONLY_APPS = {'sessions', 'auth', 'contenttypes'}
+
+
+def _replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def is_pinned(request):
+    try:
+        until = float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+class ReplicaRouter:
+    """Чтения внутри read_from_replica идут на случайную реплику.
+
+    Всё остальное, включая любые записи, работает с default. После
+    первой записи в запросе чтения до конца запроса тоже идут в default.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = _replicas()
+        if not replicas or not getattr(_state, 'replica', False):
+            return None
+        if (
+            getattr(_state, 'written', False)
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _state.written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *_replicas()}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики — копии default, схему в них не трогаем.
+        if db in _replicas():
+            return False
+        return None
+
+
+def use_primary():
+    """Отправляет остальные чтения текущего запроса в default.
+
+    В отличие от записи, не закрепляет пользователя за default.
+    """
+    _state.replica = False
+
+
+def read_from_replica(view):
+    """Отдаёт чтения view репликам, если пользователь не закреплён.
+
+    Пользователь закрепляется за default на REPLICA_PIN_SECONDS после
+    своей записи (ReplicaPinMiddleware), чтобы сразу видеть свой пост,
+    комментарий или подписку, даже если реплика отстаёт.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or is_pinned(request):
+            return view(request, *args, **kwargs)
+        _state.replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = False
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """Ставит cookie закрепления за default, если запрос что-то записал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.written = False
+        try:
+            response = self.get_response(request)
+            written = _state.written
+        finally:
+            _state.written = False
+        if written and _replicas():
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                str(int(time.time() + seconds)),
+                max_age=seconds,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
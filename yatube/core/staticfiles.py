@@ -0,0 +1,172 @@
+import gzip
+import json
+import mimetypes
+import os
+from email.utils import formatdate
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    # Необязательная зависимость: без неё отдаём только gzip.
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.map', '.svg', '.html', '.txt', '.json', '.xml', '.ico',
+)
+# Мелкие файлы сжатием почти не уменьшаются.
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Файлы без хеша в имени могут поменяться при следующем деплое.
+REVALIDATE = 'public, max-age=60'
+BLOCK_SIZE = 64 * 2 ** 10
+
+
+def _compressors():
+    compressors = [('gzip', '.gz', lambda data: gzip.compress(
+        data, compresslevel=9, mtime=0
+    ))]
+    if brotli is not None:
+        compressors.insert(0, ('br', '.br', lambda data: brotli.compress(
+            data, quality=11
+        )))
+    return compressors
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Хеш содержимого в именах плюс .gz и .br рядом с файлами.
+
+    Сжатые копии готовятся один раз в collectstatic, и сервер статики
+    отдаёт их без сжатия на лету.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            data = source.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for _, suffix, compress in _compressors():
+            compressed = compress(data)
+            # Сжатая копия, которая почти не меньше исходника, только
+            # тратит процессор клиента.
+            if len(compressed) < len(data) * 0.95:
+                with open(path + suffix, 'wb') as target:
+                    target.write(compressed)
+
+
+class StaticFile:
+    def __init__(self, path, immutable):
+        self.content_type = (
+            mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        )
+        self.cache_control = IMMUTABLE if immutable else REVALIDATE
+        # Варианты (кодировка, путь, размер, ETag), лучшие первыми.
+        self.variants = []
+        for encoding, suffix, _ in _compressors() + [(None, '', None)]:
+            if os.path.exists(path + suffix):
+                stat = os.stat(path + suffix)
+                self.variants.append((
+                    encoding,
+                    path + suffix,
+                    stat.st_size,
+                    f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+                ))
+        self.last_modified = formatdate(
+            os.stat(path).st_mtime, usegmt=True
+        )
+
+    def variant(self, accept_encoding):
+        accepted = {
+            part.split(';')[0].strip() for part in accept_encoding.split(',')
+            if not part.strip().endswith(('q=0', 'q=0.0'))
+        }
+        for variant in self.variants:
+            if variant[0] is None or variant[0] in accepted:
+                return variant
+
+
+class StaticFilesApplication:
+    """WSGI-обёртка, которая отдаёт STATIC_ROOT, не заходя в Django.
+
+    Список файлов собирается при старте: статика меняется только
+    с деплоем, а пути вне списка (в том числе с ..) уходят в
+    приложение. Файлы с хешем из манифеста кешируются навсегда
+    (immutable), тело отдаётся через wsgi.file_wrapper, который
+    gunicorn и uWSGI превращают в sendfile без копирования в Python.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = root or settings.STATIC_ROOT
+        self.prefix = prefix or settings.STATIC_URL
+        self.files = self.scan()
+
+    def hashed_names(self):
+        manifest = os.path.join(
+            self.root, ManifestStaticFilesStorage.manifest_name
+        )
+        try:
+            with open(manifest) as file_:
+                return set(json.load(file_).get('paths', {}).values())
+        except (OSError, ValueError):
+            return set()
+
+    def scan(self):
+        hashed = self.hashed_names()
+        suffixes = tuple(suffix for _, suffix, _ in _compressors())
+        files = {}
+        for root, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(suffixes):
+                    continue
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                files[name] = StaticFile(path, name in hashed)
+        return files
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        method = environ.get('REQUEST_METHOD')
+        static_file = None
+        if path.startswith(self.prefix) and method in ('GET', 'HEAD'):
+            static_file = self.files.get(path[len(self.prefix):])
+        if static_file is None:
+            return self.application(environ, start_response)
+
+        encoding, file_path, size, etag = static_file.variant(
+            environ.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        headers = [
+            ('Cache-Control', static_file.cache_control),
+            ('ETag', etag),
+            ('Last-Modified', static_file.last_modified),
+        ]
+        if len(static_file.variants) > 1:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if environ.get('HTTP_IF_NONE_MATCH') == etag:
+            start_response('304 Not Modified', headers)
+            return []
+        headers += [
+            ('Content-Type', static_file.content_type),
+            ('Content-Length', str(size)),
+        ]
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        start_response('200 OK', headers)
+        if method == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(file_path, 'rb'), BLOCK_SIZE)
@@ -0,0 +1,34 @@
+import logging
+import os
+
+from django.template import TemplateSyntaxError, engines
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def warm_templates():
+    """Компилирует все шаблоны из DIRS шаблонизаторов.
+
+    С cached loader они попадают в его кеш до первого запроса, и ни
+    один воркер не читает и не разбирает шаблоны под нагрузкой.
+    Возвращает число скомпилированных шаблонов.
+    """
+    count = 0
+    for engine in engines.all():
+        for directory in getattr(engine, 'dirs', ()):
+            for root, _, filenames in os.walk(directory):
+                for filename in sorted(filenames):
+                    if not filename.endswith(TEMPLATE_EXTENSIONS):
+                        continue
+                    name = os.path.relpath(
+                        os.path.join(root, filename), directory
+                    ).replace(os.sep, '/')
+                    try:
+                        engine.get_template(name)
+                    except TemplateSyntaxError:
+                        logger.exception('Шаблон %s не компилируется', name)
+                    else:
+                        count += 1
+    return count
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Follow, Post, Group, Comment
+from .search import filter_by_match
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -10,6 +11,15 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%q%' по всей таблице ищем по индексу FTS5.
+        found = filter_by_match(queryset, search_term)
+        if found is None:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return found, False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
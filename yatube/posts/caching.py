@@ -0,0 +1,247 @@
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import replicas
+from . import utils
+
+VERSION_KEY = 'listing_version:{}'
+CHANGED_KEY = 'listing_changed:{}'
+LOCK_KEY = 'recompute_lock:{}'
+LOCK_POLL_INTERVAL = 0.05
+# Стек пересчитываемых сейчас фрагментов: отметка True значит, что
+# внутри отдано прошлое значение вложенного фрагмента.
+_computing = threading.local()
+# Общий scope для всех лент: сбрасывается, когда меняется то, что
+# выводится в каждой ленте (например, название группы).
+ALL = 'all'
+INDEX = 'index'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def followers_scope(author_id):
+    # Не входит в ключи фрагментов, только в валидаторы страницы
+    # профиля: от подписок зависит кнопка «Подписаться».
+    return f'followers:{author_id}'
+
+
+def post_scopes(group_id, author_id):
+    scopes = [INDEX, author_scope(author_id)]
+    if group_id is not None:
+        scopes.append(group_scope(group_id))
+    return scopes
+
+
+def _new_version():
+    # Версия стартует со времени создания, а не с 1: если ключ версии
+    # вытеснят из кеша, старые фрагменты не совпадут с новой версией.
+    return time.time_ns()
+
+
+def _fetch(scopes):
+    """Версии scope-ов и время их изменения одним запросом к кешу.
+
+    Пока реплика может не догнать изменение scope-а (REPLICA_PIN_SECONDS
+    после него), остальные чтения запроса идут в default: иначе старые
+    данные из реплики попали бы во фрагменты и валидаторы под новой
+    версией.
+    """
+    version_keys = [VERSION_KEY.format(scope) for scope in scopes]
+    changed_keys = [CHANGED_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(version_keys + changed_keys)
+    missing = {
+        key: _new_version() for key in version_keys if key not in found
+    }
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    changed = [found.get(key) for key in changed_keys]
+    recent = time.time() - settings.REPLICA_PIN_SECONDS
+    if any(when is not None and when > recent for when in changed):
+        replicas.use_primary()
+    return [found[key] for key in version_keys], changed
+
+
+def get_versions(scopes):
+    return _fetch(scopes)[0]
+
+
+def bump(*scopes):
+    # Время изменения — раньше версии: читатель, увидевший новую
+    # версию, уже знает, что реплике нельзя верить.
+    now = time.time()
+    cache.set_many(
+        {CHANGED_KEY.format(scope): now for scope in scopes}, None
+    )
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def validators(scopes):
+    """Версии scope-ов и время их последнего изменения.
+
+    Если время изменения потерялось из кеша, считаем, что изменение
+    было только что: лишний 200 лучше ошибочного 304.
+    """
+    versions, changed = _fetch(scopes)
+    now = time.time()
+    missing = {
+        CHANGED_KEY.format(scope): now
+        for scope, when in zip(scopes, changed) if when is None
+    }
+    if missing:
+        cache.set_many(missing, None)
+        replicas.use_primary()
+    last_changed = datetime.fromtimestamp(
+        max(now if when is None else when for when in changed),
+        tz=timezone.utc,
+    )
+    return versions, last_changed
+
+
+def attach_versions(posts):
+    """Проставляет post.cache_version для ключей фрагментов карточек.
+
+    Версия меняется при правке поста и комментариев (updated_at), при
+    сбросе общего scope и когда готова миниатюра, поэтому вызывать
+    после thumbnails.attach. Новые посты автора карточки не трогают.
+    """
+    posts = list(posts)
+    (shared,) = get_versions([ALL])
+    for post in posts:
+        thumbnail = ''
+        if post.image:
+            ready = getattr(post, 'thumbnails', {}).get('card') is not None
+            thumbnail = 'ready' if ready else 'pending'
+        post.cache_version = ':'.join(str(part) for part in (
+            post.pk, post.updated_at.timestamp(), shared, thumbnail,
+        ))
+
+
+def _position(request):
+    cursor = request.GET.get('cursor')
+    page_number = request.GET.get('page')
+    if cursor is not None:
+        return 'cursor:' + cursor if utils.is_signed_cursor(cursor) else None
+    if page_number is not None:
+        if not page_number.isdigit():
+            return None
+        number = int(page_number)
+        if not 1 <= number <= settings.LISTING_CACHE_PAGES:
+            return None
+        return f'page:{number}'
+    return 'first'
+
+
+def listing_key(request, *scopes):
+    """Ключ фрагмента ленты: версии scope-ов плюс номер страницы/курсор.
+
+    Для курсора без нашей подписи и для номера страницы вне первых
+    LISTING_CACHE_PAGES возвращает None: такие страницы рендерятся
+    без кеша, иначе любой клиент мог бы заполнить кеш своими ключами.
+    """
+    position = _position(request)
+    if position is None:
+        return None
+    versions = get_versions((ALL,) + scopes)
+    return ':'.join(str(version) for version in versions) + ':' + position
+
+
+def _expires_early(expires, delta):
+    # Вероятностный ранний пересчёт (XFetch): чем ближе срок и чем
+    # дольше пересчёт, тем вероятнее, что один из запросов обновит
+    # значение заранее, и у всех сразу оно не истечёт.
+    if expires is None:
+        return False
+    jitter = -math.log(1 - random.random())
+    return (
+        time.time() + delta * settings.CACHE_EARLY_EXPIRY_BETA * jitter
+        >= expires
+    )
+
+
+def _compute(key, compute, timeout, stale_key):
+    stack = _computing.__dict__.setdefault('stack', [])
+    stack.append(False)
+    started = time.monotonic()
+    try:
+        value = compute()
+    finally:
+        served_stale = stack.pop()
+    delta = time.monotonic() - started
+    if served_stale:
+        # Под новой версией нельзя хранить HTML со старой вложенной
+        # карточкой: он прожил бы весь timeout. Отдаём без записи,
+        # и внешний фрагмент, если есть, тоже не запишется.
+        _served_stale()
+        return value
+    expires = None if timeout is None else time.time() + timeout
+    entries = {key: (value, expires, delta)}
+    if stale_key is not None:
+        entries[stale_key] = (value, expires, delta)
+    cache.set_many(entries, timeout)
+    return value
+
+
+def _served_stale(on_stale=None):
+    stack = getattr(_computing, 'stack', None)
+    if stack:
+        stack[-1] = True
+    if on_stale is not None:
+        on_stale()
+
+
+def get_or_compute(key, compute, timeout, stale_key=None, allow_stale=True,
+                   on_stale=None):
+    """cache.get_or_set, который пересчитывает значение один раз.
+
+    Пересчитывает только тот, кто взял блокировку ключа; остальные
+    отдают прошлое значение из stale_key (если allow_stale) или ждут
+    результата. stale_key не зависит от версии, под ним лежит последнее
+    посчитанное значение фрагмента. Если отдано прошлое значение,
+    вызывается on_stale, а объемлющий фрагмент, внутри пересчёта
+    которого это случилось, не кешируется.
+    """
+    entry = cache.get(key)
+    if entry is not None and not _expires_early(*entry[1:]):
+        return entry[0]
+    stale = False
+    if entry is None and stale_key is not None and allow_stale:
+        entry = cache.get(stale_key)
+        stale = entry is not None
+    lock = LOCK_KEY.format(key)
+    if cache.add(lock, True, settings.CACHE_LOCK_TIMEOUT):
+        try:
+            return _compute(key, compute, timeout, stale_key)
+        finally:
+            cache.delete(lock)
+    if entry is not None:
+        if stale:
+            _served_stale(on_stale)
+        return entry[0]
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if lock not in cache:
+            # Пересчитывавший упал, не положив значение.
+            break
+    return _compute(key, compute, timeout, stale_key)
@@ -0,0 +1,108 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.views.decorators.http import condition
+
+from . import caching
+from .models import Group, Post, User
+
+
+def index_scopes(request):
+    # Для вошедших в ленту попадают персональные элементы,
+    # поэтому условные ответы отдаём только анонимам.
+    if request.user.is_authenticated:
+        return None
+    return [caching.INDEX]
+
+
+def group_scopes(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return [caching.group_scope(group_id)]
+
+
+def profile_scopes(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [
+        caching.author_scope(author_id), caching.followers_scope(author_id)
+    ]
+
+
+def post_detail_scopes(request, post_id):
+    # Правка поста, комментарии и счётчик постов автора сбрасывают
+    # scope автора, название группы — общий scope.
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [caching.author_scope(author_id)]
+
+
+def _validators(request, scopes_func, args, kwargs):
+    # condition() спрашивает ETag и Last-Modified по отдельности,
+    # а запросы за scope-ами хочется делать один раз.
+    if not hasattr(request, '_page_validators'):
+        scopes = scopes_func(request, *args, **kwargs)
+        request._page_validators = None if scopes is None else (
+            caching.validators([caching.ALL, *scopes])
+        )
+    return request._page_validators
+
+
+def listing_condition(scopes_func):
+    """condition() c валидаторами из версий кеша лент.
+
+    Страница не рендерится, чтобы посчитать ETag: он собирается из
+    версий scope-ов, пути и того, кто смотрит страницу. Если в ответ
+    попал прошлый фрагмент (пока другой запрос его пересчитывает),
+    валидаторы новых версий к нему не подходят: такой ответ уходит
+    без них и с Cache-Control: no-store.
+    """
+    def etag(request, *args, **kwargs):
+        validators = _validators(request, scopes_func, args, kwargs)
+        if validators is None:
+            return None
+        versions, _ = validators
+        parts = [
+            request.user.pk or '',
+            # В форме комментария зашит CSRF-токен: после смены
+            # токена закешированная страница не годится.
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            request.get_full_path(),
+            *versions,
+        ]
+        return hashlib.md5(
+            ':'.join(str(part) for part in parts).encode()
+        ).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        # Last-Modified не различает пользователей, отдаём его анонимам.
+        if request.user.is_authenticated:
+            return None
+        validators = _validators(request, scopes_func, args, kwargs)
+        return None if validators is None else validators[1]
+
+    conditional = condition(etag_func=etag, last_modified_func=last_modified)
+
+    def decorator(view):
+        conditional_view = conditional(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if getattr(request, 'served_stale', False):
+                del response['ETag']
+                del response['Last-Modified']
+                response['Cache-Control'] = 'no-store'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,139 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+def _count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def reconcile_author(user_id):
+    stats, _ = AuthorStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id
+            ).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id
+            ).count(),
+        },
+    )
+    return stats
+
+
+def stats_for(user):
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        user.stats = reconcile_author(user.pk)
+        return user.stats
+
+
+def _shifted(field, delta):
+    # Счётчик мог разойтись с данными (ручная правка, сбой между
+    # удалением и вычитанием): уходить в минус не даём, иначе CHECK
+    # у PositiveIntegerField оборвёт удаление. Расхождение поправит
+    # reconcile_counters.
+    if delta < 0:
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def _add_author(user_id, field, delta):
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: _shifted(field, delta)}
+    )
+    # Строки счётчиков может не быть (bulk_create пользователей и т.п.):
+    # при увеличении создаём её сразу с точными значениями.
+    if not updated and delta > 0:
+        reconcile_author(user_id)
+
+
+def _add(model, pk, field, delta, **extra):
+    if pk is not None:
+        model.objects.filter(pk=pk).update(
+            **{field: _shifted(field, delta)}, **extra
+        )
+
+
+def post_added(post):
+    _add_author(post.author_id, 'posts_count', 1)
+    _add(Group, post.group_id, 'posts_count', 1)
+
+
+def post_removed(post):
+    _add_author(post.author_id, 'posts_count', -1)
+    _add(Group, post.group_id, 'posts_count', -1)
+
+
+def post_moved(old_group_id, new_group_id):
+    _add(Group, old_group_id, 'posts_count', -1)
+    _add(Group, new_group_id, 'posts_count', 1)
+
+
+def comment_added(comment):
+    _add(
+        Post, comment.post_id, 'comments_count', 1,
+        updated_at=timezone.now(),
+    )
+
+
+def comment_removed(comment):
+    _add(
+        Post, comment.post_id, 'comments_count', -1,
+        updated_at=timezone.now(),
+    )
+
+
+def follow_added(follow):
+    _add_author(follow.author_id, 'followers_count', 1)
+    _add_author(follow.user_id, 'following_count', 1)
+
+
+def follow_removed(follow):
+    _add_author(follow.author_id, 'followers_count', -1)
+    _add_author(follow.user_id, 'following_count', -1)
+
+
+def reconcile():
+    """Пересчитывает все счётчики, возвращает число исправленных строк."""
+    fixed = 0
+    groups = Group.objects.annotate(
+        actual=_count_subquery(Post.objects, 'group_id')
+    ).exclude(posts_count=F('actual')).values_list('pk', 'actual')
+    for pk, actual in groups.iterator():
+        Group.objects.filter(pk=pk).update(posts_count=actual)
+        fixed += 1
+
+    posts = Post.objects.annotate(
+        actual=_count_subquery(Comment.objects, 'post_id')
+    ).exclude(comments_count=F('actual')).values_list('pk', 'actual')
+    for pk, actual in posts.iterator():
+        Post.objects.filter(pk=pk).update(comments_count=actual)
+        fixed += 1
+
+    users = User.objects.annotate(
+        posts_actual=_count_subquery(Post.objects, 'author_id'),
+        followers_actual=_count_subquery(Follow.objects, 'author_id'),
+        following_actual=_count_subquery(Follow.objects, 'user_id'),
+    ).values_list(
+        'pk', 'posts_actual', 'followers_actual', 'following_actual'
+    )
+    stored = {
+        stats[0]: stats[1:] for stats in AuthorStats.objects.values_list(
+            'user_id', 'posts_count', 'followers_count', 'following_count'
+        )
+    }
+    for pk, *actual in users.iterator():
+        if stored.get(pk) != tuple(actual):
+            reconcile_author(pk)
+            fixed += 1
+    return fixed
@@ -1,6 +1,11 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
+from .images import normalize
 from .models import Post, Comment
+from .uploads import file_too_large, validate_image_upload
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +13,33 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image',)
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            # ImageField только сверяет структуру файла, пиксели
+            # декодирует normalize, поэтому лимиты проверяем до неё.
+            validate_image_upload(image)
+            try:
+                return normalize(image)
+            except (OSError, Image.DecompressionBombError):
+                # Заголовок целый, а сами пиксели обрезаны или битые.
+                raise ValidationError(
+                    self.fields['image'].error_messages['invalid_image'],
+                    code='invalid_image',
+                )
+        return image
+
+    def __init__(self, *args, oversized=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        # Поля, загрузку которых BoundedUploadHandler оборвал.
+        self.oversized = oversized
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'image' in self.oversized:
+            self.add_error('image', file_too_large())
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
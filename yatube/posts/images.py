@@ -0,0 +1,59 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from PIL import Image, ImageOps
+
+# Форматы, которые сохраняем как есть; остальные перекодируем в JPEG.
+KEEP_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+EXIF_ORIENTATION = 0x0112
+# Из image.info переносим только то, что нужно для самих пикселей.
+KEEP_INFO = ('transparency',)
+
+
+def normalize(upload):
+    """Готовит загруженную картинку к хранению.
+
+    Поворачивает её по EXIF, выбрасывает метаданные и уменьшает
+    исходники больше POST_IMAGE_MAX_SIDE. Анимации не трогаем.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        if getattr(image, 'is_animated', False):
+            upload.seek(0)
+            return upload
+        format_ = image.format
+        max_side = settings.POST_IMAGE_MAX_SIDE
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе,
+        # тогда полноразмерный растр в памяти не появляется.
+        image.draft('RGB', (max_side, max_side))
+        if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+            image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        name = upload.name
+        params = {}
+        if format_ not in KEEP_FORMATS or format_ not in Image.SAVE:
+            format_ = 'JPEG'
+            name = os.path.splitext(name)[0] + '.jpg'
+        if format_ == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            params = {'quality': 90, 'optimize': True, 'progressive': True}
+        # Новый файл собирается только из пикселей: EXIF, GPS и прочие
+        # метаданные исходника в него не попадают. PNG и WEBP иначе
+        # взяли бы EXIF из image.info при сохранении.
+        image.info = {
+            key: value for key, value in image.info.items()
+            if key in KEEP_INFO
+        }
+        buffer = BytesIO()
+        image.save(buffer, format=format_, exif=b'', **params)
+    return InMemoryUploadedFile(
+        buffer,
+        field_name=getattr(upload, 'field_name', None),
+        name=name,
+        content_type=Image.MIME.get(format_),
+        size=buffer.tell(),
+        charset=None,
+    )
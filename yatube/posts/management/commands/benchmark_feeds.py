@@ -0,0 +1,112 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+from posts.utils import page_obj_gen
+
+User = get_user_model()
+
+MODES = ('pull', 'push', 'hybrid')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает pull, push и hybrid ленты подписок на синтетическом '
+        'графе. Все данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=50)
+        parser.add_argument('--celebrities', type=int, default=5)
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--writes', type=int, default=50)
+        parser.add_argument('--reads', type=int, default=50)
+        parser.add_argument('--threshold', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def build_graph(self, rng, options):
+        User.objects.bulk_create(
+            User(username=f'feed_bench_{number}')
+            for number in range(options['users'])
+        )
+        users = list(User.objects.filter(
+            username__startswith='feed_bench_'
+        ).order_by('pk'))
+        celebrities = users[:options['celebrities']]
+        follows = set()
+        for user in users:
+            # Знаменитостей читает примерно половина пользователей.
+            for author in celebrities:
+                if author != user and rng.random() < 0.5:
+                    follows.add((user.pk, author.pk))
+            for author in rng.sample(users, options['follows']):
+                if author != user:
+                    follows.add((user.pk, author.pk))
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in follows
+        )
+        Post.objects.bulk_create(
+            Post(author=author, text=f'пост {number}')
+            for author in users for number in range(options['posts'])
+        )
+        return users, celebrities
+
+    def pull_feed(self, reader):
+        followings = Follow.objects.filter(user=reader).values_list('author')
+        return timeline.by_post(
+            Post.objects.filter(author_id__in=followings)
+        ), None
+
+    def measure(self, writers, readers, feed):
+        started = time.perf_counter()
+        for author in writers:
+            Post.objects.create(author=author, text='новый пост')
+        write_time = (time.perf_counter() - started) / len(writers)
+
+        request = RequestFactory().get('/follow/')
+        started = time.perf_counter()
+        for reader in readers:
+            list(page_obj_gen(request, *feed(reader), **timeline.FEED_KEY))
+        read_time = (time.perf_counter() - started) / len(readers)
+        return write_time, read_time
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        users, celebrities = self.build_graph(rng, options)
+        readers = rng.sample(users, options['reads'])
+        # Пишут и знаменитости, и обычные авторы.
+        writers = [
+            rng.choice(celebrities) if number % 5 == 0 else rng.choice(users)
+            for number in range(options['writes'])
+        ]
+        self.stdout.write(
+            f'{"mode":<8}{"write, ms":>12}{"read, ms":>12}{"entries":>10}'
+        )
+        # Порог знаменитости для каждого режима: 0 - посты никому
+        # не раздаются (pull), None - раздаются всем подписчикам (push).
+        thresholds = {'pull': 0, 'push': None, 'hybrid': options['threshold']}
+        for mode in MODES:
+            threshold = thresholds[mode]
+            with override_settings(TIMELINE_CELEBRITY_THRESHOLD=threshold):
+                for reader in readers:
+                    timeline.rebuild(reader.pk)
+                feed = self.pull_feed if mode == 'pull' else timeline.feed
+                write_time, read_time = self.measure(writers, readers, feed)
+            entries = TimelineEntry.objects.count()
+            self.stdout.write(
+                f'{mode:<8}{write_time * 1000:>12.2f}'
+                f'{read_time * 1000:>12.2f}{entries:>10}'
+            )
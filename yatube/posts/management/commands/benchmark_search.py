@@ -0,0 +1,78 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.test import RequestFactory
+
+from posts.models import Post
+from posts.search import fts_available, search_posts
+from posts.utils import page_obj_gen
+
+User = get_user_model()
+
+SYLLABLES = ('ма', 'ши', 'на', 'до', 'ро', 'га', 'ле', 'то', 'ку', 'пе')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск через FTS5 и icontains на синтетических постах. '
+        'Все данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError('Таблица FTS5 не найдена, выполните migrate')
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        vocabulary = [
+            ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            for _ in range(5000)
+        ]
+        author = User.objects.create(username='search_bench')
+        started = time.perf_counter()
+        for offset in range(0, options['rows'], options['batch_size']):
+            size = min(options['batch_size'], options['rows'] - offset)
+            Post.objects.bulk_create(
+                Post(author=author, text=' '.join(rng.sample(vocabulary, 30)))
+                for _ in range(size)
+            )
+        self.stdout.write(
+            f'Вставка и индексация {options["rows"]} постов: '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+
+        words = rng.sample(vocabulary, options['queries'])
+        request = RequestFactory().get('/search/')
+
+        def fts(word):
+            posts, paginator_class = search_posts(word[:4])
+            return page_obj_gen(
+                request, posts, paginator_class=paginator_class
+            )
+
+        def scan(word):
+            posts = Post.objects.for_listing().filter(
+                Q(text__icontains=word[:4])
+                | Q(group__title__icontains=word[:4])
+            )
+            return page_obj_gen(request, posts)
+
+        for name, search in (('fts5', fts), ('icontains', scan)):
+            started = time.perf_counter()
+            for word in words:
+                list(search(word))
+            elapsed = (time.perf_counter() - started) / len(words)
+            self.stdout.write(f'{name:<10}{elapsed * 1000:>10.2f} мс/запрос')
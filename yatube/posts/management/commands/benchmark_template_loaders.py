@@ -0,0 +1,102 @@
+import copy
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.warmup import warm_templates
+from posts.models import Group, Post
+
+from .benchmark_templates import template_timer
+
+User = get_user_model()
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def templates_with(loaders):
+    templates = copy.deepcopy(settings.TEMPLATES)
+    templates[0]['APP_DIRS'] = False
+    templates[0]['OPTIONS']['loaders'] = loaders
+    return templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Процессорное время на запрос с обычными загрузчиками шаблонов '
+        'и с cached loader после прогрева (как в профиле prod). '
+        'Все данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        author = User.objects.create(username='loader_bench')
+        group = Group.objects.create(
+            title='Бенчмарк', slug='loader-bench', description='-'
+        )
+        posts = [
+            Post.objects.create(
+                author=author, group=group, text=f'Пост {number}'
+            )
+            for number in range(settings.POST_COUNT)
+        ]
+        pages = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=[group.slug]),
+            'profile': reverse('posts:profile', args=[author.username]),
+            'detail': reverse('posts:post_detail', args=[posts[0].pk]),
+            'login': reverse('users:login'),
+        }
+        configs = {
+            'обычные': templates_with(LOADERS),
+            'cached': templates_with(
+                [('django.template.loaders.cached.Loader', LOADERS)]
+            ),
+        }
+        client = Client()
+        results = {}
+        for name, templates in configs.items():
+            with override_settings(TEMPLATES=templates):
+                warm_templates()
+                for page, path in pages.items():
+                    # Первый запрос прогревает кеши фрагментов.
+                    client.get(path)
+                    with template_timer(time.process_time) as timer:
+                        started = time.process_time()
+                        for _ in range(options['repeat']):
+                            client.get(path)
+                        total = time.process_time() - started
+                    results[page, name] = (
+                        total / options['repeat'],
+                        timer['total'] / options['repeat'],
+                    )
+        self.stdout.write(
+            'мс CPU на запрос, в скобках — из них рендеринг шаблонов'
+        )
+        self.stdout.write(
+            f'{"":<10}{"обычные":>16}{"cached":>16}{"экономия":>10}'
+        )
+        for page in pages:
+            (plain, plain_render), (cached, cached_render) = (
+                results[page, name] for name in configs
+            )
+            plain_cell = f'{plain * 1000:.2f} ({plain_render * 1000:.2f})'
+            cached_cell = f'{cached * 1000:.2f} ({cached_render * 1000:.2f})'
+            self.stdout.write(
+                f'{page:<10}{plain_cell:>16}{cached_cell:>16}'
+                f'{(plain - cached) * 1000:>10.2f}'
+            )
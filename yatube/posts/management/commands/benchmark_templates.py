@@ -0,0 +1,98 @@
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.backends.django import Template
+from django.test import Client
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+@contextmanager
+def template_timer(clock=time.perf_counter):
+    """Суммирует время рендеринга шаблонов верхнего уровня."""
+    render = Template.render
+    state = {'depth': 0, 'total': 0.0}
+
+    def timed(template, *args, **kwargs):
+        state['depth'] += 1
+        started = clock()
+        try:
+            return render(template, *args, **kwargs)
+        finally:
+            state['depth'] -= 1
+            if not state['depth']:
+                state['total'] += clock() - started
+
+    with mock.patch.object(Template, 'render', timed):
+        yield state
+
+
+class Command(BaseCommand):
+    help = (
+        'Время рендеринга шаблонов лент: без кеша (как до post_card), '
+        'после сброса версии ленты (карточки из кеша) и из кеша целиком. '
+        'Все данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        author = User.objects.create(
+            username='template_bench', first_name='Имя', last_name='Автор'
+        )
+        reader = User.objects.create(username='template_bench_reader')
+        group = Group.objects.create(
+            title='Бенчмарк', slug='template-bench', description='-'
+        )
+        Follow.objects.create(user=reader, author=author)
+        for number in range(options['posts']):
+            Post.objects.create(
+                author=author, group=group,
+                text=f'Пост {number}\n' + 'строка текста\n' * 20,
+            )
+        client = Client()
+        client.force_login(reader)
+        pages = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=[group.slug]),
+            'profile': reverse('posts:profile', args=[author.username]),
+            'follow': reverse('posts:follow_index'),
+        }
+        # Сброс общего scope меняет и версии карточек, сброс scope-ов
+        # ленты — только ключи фрагментов страниц.
+        scenarios = {
+            'без кеша': lambda: caching.bump(caching.ALL),
+            'карточки': lambda: caching.bump(
+                *caching.post_scopes(group.pk, author.pk)
+            ),
+            'из кеша': lambda: None,
+        }
+        self.stdout.write(
+            f'{"":<10}' + ''.join(f'{name:>12}' for name in scenarios)
+            + '   мс/страница'
+        )
+        for page, path in pages.items():
+            row = f'{page:<10}'
+            for prepare in scenarios.values():
+                client.get(path)
+                with template_timer() as timer:
+                    for _ in range(options['repeat']):
+                        prepare()
+                        client.get(path)
+                row += f'{timer["total"] * 1000 / options["repeat"]:>12.2f}'
+            self.stdout.write(row)
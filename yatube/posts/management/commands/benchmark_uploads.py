@@ -0,0 +1,107 @@
+import multiprocessing
+import resource
+from io import BytesIO
+
+from django import forms
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler, TemporaryFileUploadHandler,
+)
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from PIL import Image
+
+from posts.forms import PostForm
+from posts.images import normalize
+from posts.models import Post
+from posts.uploads import BoundedUploadHandler
+
+DefaultPostForm = forms.modelform_factory(Post, fields=('text', 'image'))
+
+MODES = {
+    'default': (
+        [MemoryFileUploadHandler, TemporaryFileUploadHandler],
+        DefaultPostForm,
+    ),
+    'bounded': ([BoundedUploadHandler], PostForm),
+}
+
+
+def photo(side):
+    buffer = BytesIO()
+    Image.effect_noise((side, side * 3 // 4), 64).convert('RGB').save(
+        buffer, format='JPEG', quality=90
+    )
+    return buffer.getvalue()
+
+
+def bomb(side):
+    # Однотонный PNG сжимается в килобайты при любом числе пикселей.
+    buffer = BytesIO()
+    Image.new('L', (side, side)).save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def measure(mode, name, content, queue):
+    handlers, form_class = MODES[mode]
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    request = RequestFactory().post('/create/', data={
+        'text': 'замер',
+        'image': _NamedBytes(name, content),
+    })
+    request.upload_handlers = [handler(request) for handler in handlers]
+    extra = {}
+    if form_class is PostForm:
+        extra['oversized'] = request.oversized_uploads
+    form = form_class(request.POST, request.FILES, **extra)
+    valid = form.is_valid()
+    if valid and form_class is DefaultPostForm:
+        # PostForm проверяет и нормализует картинку сам, в clean_image.
+        normalize(form.cleaned_data['image'])
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((valid, peak - before))
+
+
+class _NamedBytes(BytesIO):
+    def __init__(self, name, content):
+        super().__init__(content)
+        self.name = name
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет пиковую память воркера при загрузке и нормализации '
+        'картинки поста со стандартными обработчиками и с '
+        'BoundedUploadHandler.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photo-side', type=int, default=4000)
+        parser.add_argument('--bomb-side', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        cases = (
+            ('photo.jpg', photo(options['photo_side'])),
+            ('bomb.png', bomb(options['bomb_side'])),
+        )
+        # Каждый замер в отдельном процессе: ru_maxrss только растёт.
+        context = multiprocessing.get_context('fork')
+        for name, content in cases:
+            for mode in MODES:
+                queue = context.Queue()
+                process = context.Process(
+                    target=measure, args=(mode, name, content, queue)
+                )
+                process.start()
+                process.join()
+                if process.exitcode:
+                    self.stdout.write(
+                        f'{name:<12}{mode:<10}процесс упал '
+                        f'(код {process.exitcode})'
+                    )
+                    continue
+                valid, peak = queue.get()
+                verdict = 'принят' if valid else 'отклонён'
+                self.stdout.write(
+                    f'{name:<12}{mode:<10}{len(content) / 2 ** 20:>8.1f} МБ'
+                    f'{peak / 1024:>10.1f} МБ пик  {verdict}'
+                )
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import caching
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище с именами по хешу '
+        'содержимого, объединяя одинаковые файлы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не менять',
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        moved = duplicates = missing = saved = 0
+        for name in names.iterator():
+            if storage.is_content_name(name):
+                continue
+            if not storage.exists(name):
+                missing += 1
+                self.stderr.write(f'Нет файла: {name}')
+                continue
+            with storage.open(name) as file_:
+                new_name = storage.content_name(name, file_)
+                if storage.exists(new_name):
+                    duplicates += 1
+                    saved += file_.size
+                elif not options['dry_run']:
+                    new_name = storage.save(name, file_)
+            moved += 1
+            if options['dry_run']:
+                continue
+            Post.objects.filter(image=name).update(image=new_name)
+            # Миниатюры старого файла больше не нужны: у нового имени
+            # они свои и общие для всех постов с той же картинкой.
+            default.kvstore.delete(ImageFile(name, storage))
+            storage.delete(name)
+        if moved and not options['dry_run']:
+            caching.bump(caching.ALL)
+        self.stdout.write(
+            f'Перенесено файлов: {moved}, из них дублей: {duplicates} '
+            f'({saved / 2 ** 20:.1f} МБ), не найдено: {missing}'
+        )
@@ -0,0 +1,72 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:16
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+
+    def totals(queryset, field):
+        return dict(queryset.order_by().values(field).annotate(
+            total=Count('pk')
+        ).values_list(field, 'total'))
+
+    posts = totals(Post.objects.all(), 'author_id')
+    followers = totals(Follow.objects.all(), 'author_id')
+    following = totals(Follow.objects.all(), 'user_id')
+    AuthorStats.objects.bulk_create(
+        AuthorStats(
+            user_id=pk,
+            posts_count=posts.get(pk, 0),
+            followers_count=followers.get(pk, 0),
+            following_count=following.get(pk, 0),
+        )
+        for pk in User.objects.values_list('pk', flat=True)
+    )
+    for pk, total in totals(Post.objects.all(), 'group_id').items():
+        Group.objects.filter(pk=pk).update(posts_count=total)
+    Comment = apps.get_model('posts', 'Comment')
+    for pk, total in totals(Comment.objects.all(), 'post_id').items():
+        Post.objects.filter(pk=pk).update(comments_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0008_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Счётчики автора',
+                'verbose_name_plural': 'Счётчики авторов',
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# Полнотекстовый индекс FTS5 по тексту поста и названию группы.
+# Синхронизируется триггерами, поэтому подхватывает и queryset.update().
+CREATE_SQL = (
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text, group_title, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO posts_post_fts (rowid, text, group_title)
+    SELECT p.id, p.text, g.title
+    FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text, group_title)
+        VALUES (new.id, new.text,
+                (SELECT title FROM posts_group WHERE id = new.group_id));
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, group_id ON posts_post BEGIN
+        UPDATE posts_post_fts
+        SET text = new.text,
+            group_title = (SELECT title FROM posts_group
+                           WHERE id = new.group_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_group_fts_update
+    AFTER UPDATE OF title ON posts_group BEGIN
+        UPDATE posts_post_fts SET group_title = new.title
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id);
+    END
+    """,
+)
+
+DROP_SQL = (
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # На других СУБД поиск работает через icontains.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
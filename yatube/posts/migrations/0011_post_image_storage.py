@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:30
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_fts'),
+    ]
+
+    # Хранилище не влияет на схему, а пересоздание posts_post на SQLite
+    # сломало бы триггеры полнотекстового индекса.
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+            ),
+        ]),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:34
+
+from django.db import migrations, models
+from django.db.models import F
+
+# На SQLite AddField пересоздаёт posts_post, а триггер группы ссылается
+# на эту таблицу и не даёт её переименовать. Триггеры FTS снимаем
+# на время изменения схемы и ставим обратно (триггеры самой posts_post
+# пропадают вместе со старой таблицей).
+FTS_TRIGGERS = (
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text, group_title)
+        VALUES (new.id, new.text,
+                (SELECT title FROM posts_group WHERE id = new.group_id));
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, group_id ON posts_post BEGIN
+        UPDATE posts_post_fts
+        SET text = new.text,
+            group_title = (SELECT title FROM posts_group
+                           WHERE id = new.group_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_group_fts_update
+    AFTER UPDATE OF title ON posts_group BEGIN
+        UPDATE posts_post_fts SET group_title = new.title
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id);
+    END
+    """,
+)
+
+DROP_TRIGGERS = (
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        connection = schema_editor.connection
+        if (connection.vendor != 'sqlite' or 'posts_post_fts'
+                not in connection.introspection.table_names()):
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+def fill_updated_at(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(updated_at=F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(DROP_TRIGGERS), run(FTS_TRIGGERS)),
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.RunPython(run(FTS_TRIGGERS), run(DROP_TRIGGERS)),
+    ]
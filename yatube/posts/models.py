@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models import constraints
 
+from .storage import post_images
+
 User = get_user_model()
 
 
@@ -10,11 +12,33 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        # Всё, что выводят карточки постов в лентах, одним запросом.
+        return self.select_related('author', 'group').only(
+            'pk', 'text', 'pub_date', 'updated_at', 'image', 'comments_count',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__title', 'group__slug',
+        )
+
+    def changed_since(self, since, after_pk=None):
+        """Посты, изменённые после since, от старых изменений к новым.
+
+        after_pk продолжает выборку внутри одной отметки времени:
+        (since, after_pk) — последний уже обработанный пост.
+        """
+        changed = models.Q(updated_at__gt=since)
+        if after_pk is not None:
+            changed |= models.Q(updated_at=since, pk__gt=after_pk)
+        return self.filter(changed).order_by('updated_at', 'pk')
+
+
 class Post(models.Model):
 
     group = models.ForeignKey(
@@ -29,6 +53,8 @@ class Post(models.Model):
         help_text='Напишите свои мысли...'
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    # Меняется при правке поста и при изменении его комментариев
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -37,18 +63,44 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_images,
         blank=True
     )
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta():
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты сортируются по (pub_date, id): id в индексе нужен, чтобы
+        # keyset-страницы читались из индекса без сортировки.
+        indexes = (
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
 
 
+class CommentQuerySet(models.QuerySet):
+    def with_author(self):
+        return self.select_related('author').only(
+            'pk', 'text', 'created', 'post_id', 'author__username',
+        )
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -65,8 +117,14 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta():
         ordering = ['-created']
+        indexes = (models.Index(
+            fields=['post', '-created', '-id'],
+            name='comment_post_created_idx',
+        ),)
 
     def __str__(self):
         return self.text[:15]
@@ -88,3 +146,50 @@ class Follow(models.Model):
         constraints = (constraints.UniqueConstraint(
             fields=['user', 'author'], name='unique'
         ),)
+        # Уникальный индекс (user, author) покрывает подписки
+        # пользователя, этот — подписчиков автора.
+        indexes = (models.Index(
+            fields=['author', 'user'], name='follow_author_user_idx'
+        ),)
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    class Meta():
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta():
+        constraints = (constraints.UniqueConstraint(
+            fields=['user', 'post'], name='unique_timeline_entry'
+        ),)
+        indexes = (models.Index(
+            fields=['user', '-pub_date', '-post'],
+            name='timeline_user_date_post_idx',
+        ),)
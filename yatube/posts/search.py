@@ -0,0 +1,78 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .utils import NEXT, CursorPaginator
+
+FTS_TABLE = 'posts_post_fts'
+# bm25() тем меньше, чем релевантнее пост; берём со знаком минус,
+# чтобы «лучше» совпадало с убыванием, как у ленты по дате.
+RANK = f'-bm25({FTS_TABLE})'
+
+
+def fts_available():
+    return (
+        connection.vendor == 'sqlite'
+        and FTS_TABLE in connection.introspection.table_names()
+    )
+
+
+def match_expression(query):
+    # Каждое слово ищем как префикс, кавычки не дают пользователю
+    # сломать запрос синтаксисом FTS5 (OR, NEAR, скобки и т.п.).
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class SearchPaginator(CursorPaginator):
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(object_list, per_page, key_field='rank', **kwargs)
+
+    def parse_value(self, value):
+        return float(value)
+
+    def _seek(self, queryset, value, pk, direction):
+        sign = '<' if direction == NEXT else '>'
+        return self._ordered(
+            queryset, descending=direction == NEXT
+        ).extra(
+            where=[
+                f'({RANK} {sign} %s OR ({RANK} = %s AND '
+                f'{Post._meta.db_table}.id {sign} %s))'
+            ],
+            params=[value, value, pk],
+        )
+
+
+def search_posts(query):
+    """Посты по запросу и класс пагинатора для них."""
+    expression = match_expression(query)
+    posts = Post.objects.for_listing()
+    if not expression:
+        return posts.none(), CursorPaginator
+    if not fts_available():
+        return posts.filter(
+            Q(text__icontains=query) | Q(group__title__icontains=query)
+        ), CursorPaginator
+    return posts.extra(
+        select={'rank': RANK},
+        tables=[FTS_TABLE],
+        where=[
+            f'{FTS_TABLE}.rowid = {Post._meta.db_table}.id',
+            f'{FTS_TABLE} MATCH %s',
+        ],
+        params=[expression],
+    ), SearchPaginator
+
+
+def filter_by_match(queryset, query):
+    expression = match_expression(query)
+    if not expression or not fts_available():
+        return None
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [expression],
+    ))
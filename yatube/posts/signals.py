@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, counters, timeline
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+# Поля пользователя, которые выводятся в карточках и на страницах постов.
+AUTHOR_DISPLAY_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def _author_display(instance):
+    return {
+        field: instance.__dict__.get(field, DEFERRED)
+        for field in AUTHOR_DISPLAY_FIELDS
+    }
+
+
+@receiver(post_init, sender=User)
+def remember_author_display(sender, instance, **kwargs):
+    # Вход пользователя тоже сохраняет его (last_login), а сбрасывать
+    # ленты нужно только при смене имени.
+    instance._loaded_display = _author_display(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    display = _author_display(instance)
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+    elif any(
+        instance._loaded_display[field] not in (DEFERRED, value)
+        for field, value in display.items()
+    ):
+        # Карточки автора лежат внутри фрагментов всех лент, а их ключи
+        # scope автора не содержат: сбрасываем общий scope.
+        caching.bump(caching.ALL, caching.author_scope(instance.pk))
+    instance._loaded_display = display
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    # При переносе поста в другую группу нужно поправить
+    # счётчик и сбросить ленту старой группы. Отложенное (only/defer)
+    # поле не читаем, иначе каждый пост в выборке даст лишний запрос.
+    instance._loaded_group_id = instance.__dict__.get('group_id', DEFERRED)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        # loaddata: фикстура уже содержит счётчики и ленты, а reconcile
+        # и rebuild_timelines доделают остальное.
+        return
+    old_group_id = instance._loaded_group_id
+    scopes = caching.post_scopes(instance.group_id, instance.author_id)
+    if created:
+        counters.post_added(instance)
+        timeline.fan_out(instance)
+    elif old_group_id not in (DEFERRED, instance.group_id):
+        counters.post_moved(old_group_id, instance.group_id)
+        if old_group_id is not None:
+            scopes.append(caching.group_scope(old_group_id))
+    instance._loaded_group_id = instance.group_id
+    caching.bump(*scopes)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.post_removed(instance)
+    caching.bump(
+        *caching.post_scopes(instance.group_id, instance.author_id)
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.follow_added(instance)
+        timeline.backfill(instance.user_id, instance.author_id)
+        caching.bump(caching.followers_scope(instance.author_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.follow_removed(instance)
+    timeline.remove_author(instance.user_id, instance.author_id)
+    caching.bump(caching.followers_scope(instance.author_id))
+    threshold = settings.TIMELINE_CELEBRITY_THRESHOLD
+    if (threshold is not None
+            and timeline.follower_count(instance.author_id) == threshold):
+        timeline.demote(instance.author_id)
+
+
+def invalidate_comment_listings(comment):
+    post = Post.objects.filter(pk=comment.post_id).values(
+        'group_id', 'author_id'
+    ).first()
+    if post is not None:
+        caching.bump(*caching.post_scopes(**post))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.comment_added(instance)
+    else:
+        Post.objects.filter(pk=instance.post_id).update(
+            updated_at=timezone.now()
+        )
+    invalidate_comment_listings(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_removed(instance)
+    invalidate_comment_listings(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_all_listings(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    caching.bump(caching.ALL)
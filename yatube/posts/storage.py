@@ -0,0 +1,70 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME = re.compile(
+    r'(^|/)(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/(?P=a)(?P=b)[0-9a-f]{60}'
+    r'(\.\w+)?$'
+)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем sha256 от их содержимого.
+
+    Одинаковые загрузки попадают в один файл (и делят миниатюры),
+    а каталоги шардируются по первым символам хеша:
+    posts/ab/cd/abcd....jpg.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменяется хешем в _save, и совпадение имени
+        # здесь означает совпадение содержимого, а не конфликт.
+        return name
+
+    def is_content_name(self, name):
+        return CONTENT_NAME.search(name) is not None
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name),
+            digest[:2],
+            digest[2:4],
+            digest + extension,
+        )
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Пишем во временный файл и атомарно переименовываем: две
+        # одновременные загрузки одной картинки не испортят друг другу
+        # файл и не получат суффиксы к имени.
+        descriptor, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as file_:
+                for chunk in content.chunks():
+                    file_.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, full_path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+
+post_images = ContentAddressedStorage()
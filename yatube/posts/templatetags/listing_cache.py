@@ -0,0 +1,153 @@
+from django import template
+from django.conf import settings
+from django.core.cache.utils import make_template_fragment_key
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from core.replicas import is_pinned
+from posts import caching, thumbnails
+
+register = template.Library()
+
+
+def _post_version(post):
+    if not hasattr(post, 'cache_version'):
+        thumbnails.attach([post])
+        caching.attach_versions([post])
+    return post.cache_version
+
+
+def _mark_stale(request):
+    # Валидаторы страницы посчитаны по новым версиям, а HTML старый:
+    # listing_condition по этой отметке их уберёт.
+    request.served_stale = True
+
+
+def _render_cached(context, render, timeout, key, stale_vary_on):
+    request = context.get('request')
+    stale_key, allow_stale = None, False
+    if request is not None:
+        stale_key = 'stale.' + make_template_fragment_key(*stale_vary_on)
+        # Только что писавшему пользователю старая версия без его
+        # изменений не подходит, пусть дождётся пересчёта.
+        allow_stale = not is_pinned(request)
+    return caching.get_or_compute(
+        key,
+        render,
+        timeout,
+        stale_key=stale_key,
+        allow_stale=allow_stale,
+        on_stale=lambda: _mark_stale(request),
+    )
+
+
+class ListingCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        if vary_on and vary_on[0] is None:
+            # listing_key отказался строить ключ для этой страницы.
+            return self.nodelist.render(context)
+        request = context.get('request')
+        # Прошлая версия той же страницы ленты, без версий scope-ов.
+        path = request.get_full_path() if request is not None else ''
+        return _render_cached(
+            context,
+            lambda: self.nodelist.render(context),
+            self.timeout.resolve(context),
+            make_template_fragment_key(self.name, vary_on),
+            (self.name, [path]),
+        )
+
+
+class PostCacheNode(template.Node):
+    def __init__(self, nodelist, name, post, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.post = post
+        self.vary_on = vary_on
+
+    def render(self, context):
+        post = self.post.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return _render_cached(
+            context,
+            lambda: self.nodelist.render(context),
+            settings.LISTING_CACHE_TIMEOUT,
+            make_template_fragment_key(
+                self.name, [_post_version(post), *vary_on]
+            ),
+            (self.name, [post.pk]),
+        )
+
+
+def _parse(parser, token, end, min_args):
+    nodelist = parser.parse((end,))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < min_args + 1:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]} принимает как минимум {min_args} аргумента'
+        )
+    return nodelist, tokens
+
+
+@register.tag
+def listing_cache(parser, token):
+    """{% cache %} с защитой от одновременного пересчёта фрагмента.
+
+    {% listing_cache timeout name [vary_on ...] %}…{% endlisting_cache %}
+
+    Если первый vary_on равен None, фрагмент рендерится без кеша.
+    """
+    nodelist, tokens = _parse(parser, token, 'endlisting_cache', 2)
+    return ListingCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+    )
+
+
+@register.tag
+def post_cache(parser, token):
+    """Фрагмент поста, общий для всех пользователей.
+
+    {% post_cache name post [vary_on ...] %}…{% endpost_cache %}
+
+    Ключ — версия поста (caching.attach_versions) и vary_on, поэтому
+    внутрь нельзя класть ничего, что зависит от пользователя: кнопки,
+    ссылки на правку и формы остаются снаружи.
+    """
+    nodelist, tokens = _parse(parser, token, 'endpost_cache', 2)
+    return PostCacheNode(
+        nodelist,
+        tokens[1],
+        parser.compile_filter(tokens[2]),
+        [parser.compile_filter(token) for token in tokens[3:]],
+    )
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста для лент, одна и та же во всех лентах.
+
+    Как inclusion_tag, только готовый HTML кешируется по версии поста
+    и пересчитывается, лишь когда пост или его автор изменились.
+    """
+    return mark_safe(_render_cached(
+        context,
+        lambda: get_template(
+            'posts/includes/post_card.html'
+        ).render({'post': post}),
+        settings.LISTING_CACHE_TIMEOUT,
+        make_template_fragment_key(
+            'post_card', [_post_version(post)]
+        ),
+        ('post_card', [post.pk]),
+    ))
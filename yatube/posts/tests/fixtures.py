@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-
-from django.test import Client
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from ..models import Group, Post
 
@@ -47,3 +50,22 @@ class ObjectsCreate():
             title='group_title'
         )
         return group
+
+
+class QueryBudgetMixin():
+    def assertQueryBudget(self, client, path, budget):
+        # Число запросов не должно зависеть от размера страницы
+        # и не должно превышать бюджет.
+        counts = []
+        for per_page in (1, settings.POST_COUNT):
+            with override_settings(POST_COUNT=per_page):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(path)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(
+            counts[0], counts[1],
+            f'{path}: число запросов растёт вместе со страницей'
+        )
+        self.assertLessEqual(counts[1], budget, path)
@@ -0,0 +1,206 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core.backends.cache import SQLiteCache
+from posts import caching
+
+
+class SQLiteCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        options.setdefault('STATS_FLUSH_EVERY', 1)
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_shared_between_instances(self):
+        """Запись и сброс в одном процессе видны в другом."""
+        other = self.make_cache()
+        self.cache.set('version', 1, None)
+        self.assertEqual(other.get('version'), 1)
+        other.incr('version')
+        self.assertEqual(self.cache.get('version'), 2)
+        other.delete('version')
+        self.assertIsNone(self.cache.get('version'))
+
+    def test_expiry_and_add(self):
+        self.cache.set('expired', 1, 0)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertTrue(self.cache.add('expired', 2))
+        self.assertFalse(self.cache.add('expired', 3))
+        self.assertEqual(self.cache.get('expired'), 2)
+        self.assertEqual(
+            self.cache.get_many(['expired', 'missing']), {'expired': 2}
+        )
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction_by_entries(self):
+        """При переполнении вытесняются давно не читанные ключи."""
+        cache = self.make_cache(
+            MAX_ENTRIES=4, CULL_FREQUENCY=2, ACCESS_RESOLUTION=0
+        )
+        for number in range(4):
+            cache.set(number, number)
+            time.sleep(0.01)
+        cache.get(0)
+        cache.set('new', 'new')
+        self.assertEqual(
+            sorted(cache.get_many([0, 1, 2, 3, 'new']), key=str),
+            [0, 'new'],
+        )
+        # Как и у встроенных кешей, вытесняется с запасом в
+        # MAX_ENTRIES // CULL_FREQUENCY ключей.
+        self.assertEqual(cache.stats()['evictions'], 3)
+
+    def test_eviction_by_bytes(self):
+        cache = self.make_cache(MAX_BYTES=3000, ACCESS_RESOLUTION=0)
+        for number in range(5):
+            cache.set(number, b'x' * 1000)
+            time.sleep(0.01)
+        self.assertEqual(sorted(cache.get_many(range(5))), [3, 4])
+        self.assertLessEqual(cache.stats()['bytes'], 3000)
+
+    def test_writes_do_not_count_rows(self):
+        """Размер кеша берётся из cache_size, а не пересчётом таблицы."""
+        cache = self.make_cache(MAX_ENTRIES=3, MAX_BYTES=10 ** 6)
+        statements = []
+        cache._db.set_trace_callback(statements.append)
+        for number in range(5):
+            cache.set(number, 'x' * number)
+        cache.add('added', 'value')
+        cache.set('added', 'longer value')
+        self.assertFalse([sql for sql in statements if 'COUNT(' in sql])
+
+    def test_size_totals_stay_exact(self):
+        self.cache.set('key', 'value')
+        self.cache.set('key', 'a much longer value')
+        self.cache.set('number', 1)
+        self.cache.incr('number', 10 ** 30)
+        self.cache.add('added', b'x' * 100)
+        self.cache.delete('added')
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.cache.delete_many(['a'])
+        stats = self.cache.stats()
+        actual = self.cache._db.execute(
+            'SELECT COUNT(*), SUM(size) FROM cache'
+        ).fetchone()
+        self.assertEqual((stats['entries'], stats['bytes']), actual)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        self.assertEqual(self.cache.stats()['bytes'], 0)
+
+    def test_read_does_not_wait_for_writer(self):
+        """Занятая база не мешает чтению: время доступа просто не пишется."""
+        cache = self.make_cache(ACCESS_RESOLUTION=0)
+        cache.set('key', 'value')
+        writer = sqlite3.connect(self.location, isolation_level=None)
+        self.addCleanup(writer.close)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            started = time.monotonic()
+            self.assertEqual(cache.get('key'), 'value')
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            writer.execute('ROLLBACK')
+        # Попадание, которое не удалось записать, не потерялось.
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_stats(self):
+        """Попадания и промахи всех экземпляров копятся в общей таблице."""
+        other = self.make_cache()
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        other.get('key')
+        other.get_many(['key', 'missing'])
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.cache.reset_stats()
+        self.assertEqual(other.stats()['hits'], 0)
+
+
+class GetOrComputeTest(SimpleTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def compute(self, value):
+        def slow():
+            with self.calls_lock:
+                self.calls += 1
+            time.sleep(0.2)
+            return value
+        return slow
+
+    def run_concurrently(self, key, value, **kwargs):
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(caching.get_or_compute(
+                key, self.compute(value), 60, **kwargs
+            ))
+
+        threads = [
+            threading.Thread(target=worker) for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_single_flight_on_cold_key(self):
+        """Без прошлой версии все ждут одного пересчёта."""
+        results = self.run_concurrently('key:v1', 'v1', stale_key='stale')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['v1'] * self.THREADS)
+
+    def test_stale_while_revalidate(self):
+        """После смены версии остальные сразу получают прошлую."""
+        caching.get_or_compute('key:v1', self.compute('v1'), 60, 'stale')
+        self.calls = 0
+        started = time.monotonic()
+        results = self.run_concurrently('key:v2', 'v2', stale_key='stale')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results.count('v2'), 1)
+        self.assertEqual(results.count('v1'), self.THREADS - 1)
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(cache.get('key:v2')[0], 'v2')
+
+    def test_stale_not_allowed(self):
+        caching.get_or_compute('key:v1', self.compute('v1'), 60, 'stale')
+        results = self.run_concurrently(
+            'key:v2', 'v2', stale_key='stale', allow_stale=False
+        )
+        self.assertEqual(results, ['v2'] * self.THREADS)
+
+    def test_early_expiry(self):
+        """Значение пересчитывается заранее тем чаще, чем ближе срок."""
+        cache.set('key', ('old', time.time() + 1, 1), 60)
+        with mock.patch.object(caching.random, 'random', return_value=0):
+            value = caching.get_or_compute('key', self.compute('new'), 60)
+        self.assertEqual(value, 'old')
+        with mock.patch.object(
+            caching.random, 'random', return_value=1 - 1e-6
+        ):
+            value = caching.get_or_compute('key', self.compute('new'), 60)
+        self.assertEqual(value, 'new')
+        self.assertEqual(self.calls, 1)
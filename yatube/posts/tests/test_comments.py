@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Comment
@@ -42,3 +42,58 @@ class TestComments(TestCase):
         self.assertEqual(
             latest_comment.text, form_data['text']
         )
+
+
+@override_settings(COMMENT_COUNT=3)
+class TestCommentsPagination(TestCase):
+
+    def setUp(self):
+        self.post_author = UsersCreate.author_create()
+        self.POST = ObjectsCreate.post_create(None, self.post_author, TEXT)
+        self.COMMENTS = [
+            Comment.objects.create(
+                post=self.POST, author=self.post_author, text=f'коммент {n}'
+            )
+            for n in range(5)
+        ]
+        self.COMMENTS.reverse()
+        self.POST_DETAIL = reverse(
+            'posts:post_detail', kwargs={'post_id': self.POST.id}
+        )
+        self.POST_COMMENTS = reverse(
+            'posts:post_comments', kwargs={'post_id': self.POST.id}
+        )
+
+    def test_post_detail_shows_first_comments_page(self):
+        response = self.client.get(self.POST_DETAIL)
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.COMMENTS[:3])
+        self.assertContains(
+            response, f'{self.POST_COMMENTS}?cursor={comments.next_cursor}'
+        )
+
+    def test_load_more_fragment(self):
+        cursor = self.client.get(
+            self.POST_DETAIL
+        ).context['comments'].next_cursor
+        with self.assertNumQueries(2):
+            response = self.client.get(self.POST_COMMENTS, {'cursor': cursor})
+        self.assertEqual(list(response.context['comments']), self.COMMENTS[3:])
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertNotContains(response, 'load-comments')
+
+    def test_load_more_json(self):
+        response = self.client.get(self.POST_COMMENTS, {'format': 'json'})
+        data = response.json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.id for comment in self.COMMENTS[:3]],
+        )
+        self.assertEqual(
+            data['comments'][0]['author'], self.post_author.username
+        )
+        response = self.client.get(self.POST_COMMENTS, {
+            'format': 'json', 'cursor': data['next_cursor']
+        })
+        self.assertEqual(len(response.json()['comments']), 2)
+        self.assertIsNone(response.json()['next_cursor'])
@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection, connections, router, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import replicas
+from core.replicas import ReplicaPinMiddleware, read_from_replica
+from .. import caching
+from ..models import Post, User
+
+
+class PragmaTest(TestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """PRAGMA из OPTIONS выполняются на каждом соединении."""
+        # В тестовой базе в памяти WAL невозможен, проверяем остальные.
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 2 ** 10)
+        self.assertEqual(self.pragma('temp_store'), 2)
+
+
+class TransactionModeTest(TransactionTestCase):
+
+    def test_atomic_begins_immediate(self):
+        """atomic() сразу берёт блокировку на запись."""
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                Post.objects.exists()
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+@read_from_replica
+def read_view(request):
+    return HttpResponse(router.db_for_read(Post))
+
+
+@read_from_replica
+def write_then_read_view(request):
+    router.db_for_write(Post)
+    return HttpResponse(router.db_for_read(Post))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTest(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        # Вне запроса флаг записи сбрасывает только ReplicaPinMiddleware,
+        # а создание тестовой базы уже что-то записало.
+        replicas._state.written = False
+
+    def test_read_views_use_replica(self):
+        """Чтения в read_from_replica идут на реплику, прочие — в default."""
+        response = read_view(self.factory.get('/'))
+        self.assertEqual(response.content, b'replica1')
+        self.assertEqual(router.db_for_read(Post), 'default')
+        response = read_view(self.factory.post('/'))
+        self.assertEqual(response.content, b'default')
+
+    def test_sessions_and_users_read_from_primary(self):
+        for model in (Session, User, ContentType):
+            @read_from_replica
+            def view(request):
+                return HttpResponse(router.db_for_read(model))
+
+            with self.subTest(model=model.__name__):
+                self.assertEqual(
+                    view(self.factory.get('/')).content, b'default'
+                )
+
+    def test_reads_after_write_use_primary(self):
+        """После записи в том же запросе чтения идут в default."""
+        middleware = ReplicaPinMiddleware(write_then_read_view)
+        response = middleware(self.factory.get('/'))
+        self.assertEqual(response.content, b'default')
+
+    def test_writer_is_pinned(self):
+        """Записавший читает из default, пока не истечёт cookie."""
+        def write_view(request):
+            router.db_for_write(Post)
+            return HttpResponse()
+
+        response = ReplicaPinMiddleware(write_view)(self.factory.post('/'))
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        request = self.factory.get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = cookie.value
+        self.assertEqual(read_view(request).content, b'default')
+
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = str(time.time() - 1)
+        self.assertEqual(read_view(request).content, b'replica1')
+
+    def test_reads_do_not_pin(self):
+        response = ReplicaPinMiddleware(read_view)(self.factory.get('/'))
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_no_migrations_on_replicas(self):
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class LaggingReplicaTest(TestCase):
+    """replica1 — копия default, снятая до правки поста."""
+
+    def setUp(self):
+        cache.clear()
+        # Без времени изменения validators считают, что scope только
+        # что изменился, и тоже читают из default.
+        caching.bump(caching.ALL)
+        author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=author, text='Старый текст')
+        self.make_replica()
+        self.post.text = 'Новый текст'
+        self.post.save()
+        replicas._state.written = False
+
+    def make_replica(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'replica.sqlite3')
+        connection.ensure_connection()
+        replica = sqlite3.connect(path)
+        # Таблицы полнотекстового поиска так не выгрузить, а лентам
+        # они не нужны.
+        replica.executescript('\n'.join(
+            line for line in connection.connection.iterdump()
+            if '_fts' not in line
+        ))
+        replica.close()
+        connections.databases['replica1'] = dict(
+            connections.databases['default'], NAME=path
+        )
+        self.addCleanup(self.drop_replica)
+
+    def drop_replica(self):
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.databases['replica1']
+
+    def test_recent_change_is_read_from_primary(self):
+        """Сразу после правки лента читается из default и кешируется."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый текст')
+        self.assertNotContains(response, 'Старый текст')
+        with self.settings(REPLICA_PIN_SECONDS=0):
+            response = self.client.get(
+                reverse('posts:index'),
+                HTTP_IF_NONE_MATCH=response['ETag'],
+            )
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый текст')
+
+    def test_replica_is_used_when_change_is_old(self):
+        with self.settings(REPLICA_PIN_SECONDS=0):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Старый текст')
@@ -1,7 +1,11 @@
-from django.test import TestCase
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
-from ..models import User, Follow
+from .. import timeline
+from ..models import User, Follow, Post, TimelineEntry
 from .fixtures import UsersCreate, ObjectsCreate
 
 
@@ -61,3 +65,155 @@ class TestFollows(TestCase):
         response = unfollowed_user.get(self.FOLLOW_INDEX)
         unfollower_content = response.context['page_obj']
         self.assertNotIn(follower_content[0], unfollower_content)
+
+
+class TestTimeline(TestCase):
+
+    def setUp(self):
+        self.post_author = UsersCreate.author_create()
+        self.USER = UsersCreate.user_create()
+        self.AUTHORIZED_USER = UsersCreate.authorized_client_create(self.USER)
+        self.GROUP = ObjectsCreate.group_create()
+        self.OLD_POST = ObjectsCreate.post_create(
+            self.GROUP, self.post_author, TEXT
+        )
+        self.PROFILE_FOLLOW = reverse(
+            'posts:profile_follow', kwargs={
+                'username': self.post_author.username
+            }
+        )
+        self.PROFILE_UNFOLLOW = reverse(
+            'posts:profile_unfollow', kwargs={
+                'username': self.post_author.username
+            }
+        )
+
+    def timeline(self):
+        return list(TimelineEntry.objects.filter(user=self.USER).order_by(
+            '-pub_date', '-post_id'
+        ).values_list('post_id', flat=True))
+
+    def test_follow_backfills_and_unfollow_clears_timeline(self):
+        self.assertEqual(self.timeline(), [])
+        self.AUTHORIZED_USER.get(self.PROFILE_FOLLOW)
+        self.assertEqual(self.timeline(), [self.OLD_POST.id])
+        self.AUTHORIZED_USER.get(self.PROFILE_UNFOLLOW)
+        self.assertEqual(self.timeline(), [])
+
+    def test_new_post_is_pushed_to_followers(self):
+        Follow.objects.create(user=self.USER, author=self.post_author)
+        post = ObjectsCreate.post_create(self.GROUP, self.post_author, TEXT)
+        self.assertEqual(self.timeline(), [post.id, self.OLD_POST.id])
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_timeline_is_trimmed(self):
+        Follow.objects.create(user=self.USER, author=self.post_author)
+        posts = [
+            ObjectsCreate.post_create(self.GROUP, self.post_author, TEXT)
+            for _ in range(4)
+        ]
+        self.assertEqual(
+            self.timeline(), [post.id for post in reversed(posts)][:3]
+        )
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_all_followers_trimmed_in_one_statement(self):
+        readers = [self.USER] + [
+            User.objects.create(username=f'reader{number}')
+            for number in range(3)
+        ]
+        Follow.objects.bulk_create(
+            Follow(user=user, author=self.post_author) for user in readers
+        )
+        posts = [
+            ObjectsCreate.post_create(self.GROUP, self.post_author, TEXT)
+            for _ in range(3)
+        ]
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user=user, post=self.OLD_POST,
+                          pub_date=self.OLD_POST.pub_date)
+            for user in readers
+        )
+        with self.assertNumQueries(1):
+            timeline.trim_many([user.pk for user in readers])
+        for user in readers:
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    list(TimelineEntry.objects.filter(user=user).order_by(
+                        '-pub_date', '-post_id'
+                    ).values_list('post_id', flat=True)),
+                    [posts[2].id, posts[1].id],
+                )
+
+    def test_rebuild_command_restores_timeline(self):
+        Follow.objects.create(user=self.USER, author=self.post_author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline(), [self.OLD_POST.id])
+
+    def test_follow_index_reads_timeline(self):
+        Follow.objects.create(user=self.USER, author=self.post_author)
+        response = self.AUTHORIZED_USER.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(Post.objects.filter(author=self.post_author)),
+        )
+
+
+@override_settings(TIMELINE_CELEBRITY_THRESHOLD=1, POST_COUNT=3)
+class TestHybridTimeline(TestCase):
+
+    def setUp(self):
+        self.USER = UsersCreate.user_create()
+        self.AUTHORIZED_USER = UsersCreate.authorized_client_create(self.USER)
+        self.celebrity = User.objects.create(username='celebrity')
+        self.regular = User.objects.create(username='regular')
+        fan = User.objects.create(username='fan')
+        Follow.objects.create(user=fan, author=self.celebrity)
+        Follow.objects.create(user=self.USER, author=self.celebrity)
+        Follow.objects.create(user=self.USER, author=self.regular)
+        self.posts = [
+            ObjectsCreate.post_create(None, author, TEXT)
+            for author in [self.celebrity, self.regular] * 3
+        ]
+
+    def test_celebrity_posts_are_not_pushed(self):
+        pushed = TimelineEntry.objects.filter(
+            user=self.USER
+        ).values_list('post__author', flat=True)
+        self.assertEqual(set(pushed), {self.regular.id})
+
+    def test_follow_index_merges_pushed_and_pulled_posts(self):
+        expected = [post.id for post in reversed(self.posts)]
+        response = self.AUTHORIZED_USER.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual([post.id for post in page_obj], expected[:3])
+        response = self.AUTHORIZED_USER.get(
+            reverse('posts:follow_index'), {'cursor': page_obj.next_cursor}
+        )
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']], expected[3:]
+        )
+
+    def test_demoted_author_is_backfilled(self):
+        Follow.objects.filter(author=self.celebrity).exclude(
+            user=self.USER
+        ).delete()
+        pushed = TimelineEntry.objects.filter(
+            user=self.USER, post__author=self.celebrity
+        )
+        self.assertEqual(pushed.count(), 3)
+
+    def test_demote_query_count_does_not_grow_with_followers(self):
+        for number in range(10):
+            Follow.objects.create(
+                user=User.objects.create(username=f'reader_{number}'),
+                author=self.celebrity,
+            )
+        # Вставка, список подписчиков и один DELETE на пачку лент.
+        with self.assertNumQueries(3):
+            timeline.demote(self.celebrity.pk)
+        self.assertEqual(
+            TimelineEntry.objects.filter(post__author=self.celebrity).count(),
+            12 * 3,
+        )
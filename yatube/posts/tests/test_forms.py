@@ -1,12 +1,17 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
-from django.test import TestCase, override_settings
+from PIL import Image
+
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 
 from ..models import Post
+from ..uploads import BoundedUploadHandler
 from .fixtures import UsersCreate, ObjectsCreate
 
 TEXT = 'Текст поста'
@@ -64,7 +69,9 @@ class TestFormActionAndResults(TestCase):
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+# Миниатюры в этих тестах делаются синхронно: фоновые потоки пережили
+# бы тест и писали в уже удалённый TEMP_MEDIA_ROOT.
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
 class PictureTest(TestCase):
 
     @classmethod
@@ -114,10 +121,131 @@ class PictureTest(TestCase):
         self.assertEqual(latest_post.text, form_data['text'])
         self.assertEqual(latest_post.author, self.POST_AUTHOR)
         self.assertEqual(latest_post.group.id, form_data['group'])
-        img_name = latest_post.image.name.replace(
-            latest_post.image.field.upload_to, ''
+        # Картинка хранится под хешем содержимого, а не под именем файла.
+        self.assertTrue(latest_post.image.name.startswith(
+            latest_post.image.field.upload_to
+        ))
+        self.assertTrue(
+            latest_post.image.storage.is_content_name(latest_post.image.name)
+        )
+        self.assertTrue(latest_post.image.name.endswith('.gif'))
+
+    @override_settings(POST_IMAGE_MAX_SIDE=150)
+    def test_uploaded_image_is_normalized(self):
+        image = Image.new('RGB', (300, 100), 'red')
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повернуть на 90° по часовой
+        exif[0x010F] = 'Camera'
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', exif=exif.tobytes())
+        self.AUTHOR.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'фото с телефона',
+                'image': SimpleUploadedFile(
+                    'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+                ),
+            },
+        )
+        post = Post.objects.get(text='фото с телефона')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (50, 150))
+            self.assertEqual(dict(stored.getexif()), {})
+
+    def test_png_metadata_is_stripped(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (30, 20), 'red').save(
+            buffer, format='PNG', exif=exif.tobytes()
+        )
+        self.AUTHOR.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'скриншот',
+                'image': SimpleUploadedFile(
+                    'shot.png', buffer.getvalue(), content_type='image/png'
+                ),
+            },
+        )
+        post = Post.objects.get(text='скриншот')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'PNG')
+            self.assertEqual(dict(stored.getexif()), {})
+
+    def assertImageError(self, response, code):
+        errors = response.context['form'].errors.as_data()['image']
+        self.assertIn(code, [error.code for error in errors])
+
+    @override_settings(POST_IMAGE_MAX_BYTES=20)
+    def test_oversized_upload_is_rejected(self):
+        response = self.AUTHOR.post(
+            reverse('posts:post_create'),
+            data={'text': 'большой файл', 'image': self.uploaded},
+        )
+        self.assertEqual(Post.objects.count(), self.post_count)
+        self.assertImageError(response, 'file_too_large')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=20)
+    def test_oversized_upload_is_not_read_to_the_end(self):
+        # Несколько блоков по 64 КБ: дочитав первый, обработчик обрывает
+        # загрузку.
+        big = SimpleUploadedFile(
+            'big.gif', self.uploaded.read() + b'\0' * 2 ** 18,
+            content_type='image/gif',
+        )
+        with mock.patch.object(
+            BoundedUploadHandler, 'receive_data_chunk',
+            autospec=True, side_effect=BoundedUploadHandler.receive_data_chunk,
+        ) as receive:
+            self.AUTHOR.post(
+                reverse('posts:post_create'),
+                data={'text': 'большой файл', 'image': big},
+            )
+        receive.assert_called_once()
+
+    def test_upload_limit_applies_only_to_post_forms(self):
+        self.assertNotIn(
+            'posts.uploads.BoundedUploadHandler',
+            settings.FILE_UPLOAD_HANDLERS,
         )
-        self.assertEqual(
-            img_name,
-            form_data['image'].name
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.POST_AUTHOR)
+        response = client.post(
+            reverse('posts:post_create'),
+            data={'text': 'без токена', 'image': self.uploaded},
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=10 ** 6)
+    def test_decompression_bomb_is_rejected_before_decode(self):
+        buffer = BytesIO()
+        Image.new('L', (2000, 2000)).save(buffer, format='PNG')
+        bomb = SimpleUploadedFile(
+            'bomb.png', buffer.getvalue(), content_type='image/png'
+        )
+        # Плагины Pillow при первом импорте сами вызывают load.
+        Image.init()
+        with mock.patch.object(Image.Image, 'load') as load:
+            response = self.AUTHOR.post(
+                reverse('posts:post_create'),
+                data={'text': 'бомба', 'image': bomb},
+            )
+        load.assert_not_called()
+        self.assertEqual(Post.objects.count(), self.post_count)
+        self.assertImageError(response, 'too_many_pixels')
+
+    def test_truncated_image_is_rejected(self):
+        buffer = BytesIO()
+        Image.effect_noise((200, 200), 50).save(buffer, format='JPEG')
+        truncated = SimpleUploadedFile(
+            'truncated.jpg',
+            buffer.getvalue()[:buffer.tell() // 2],
+            content_type='image/jpeg',
+        )
+        response = self.AUTHOR.post(
+            reverse('posts:post_create'),
+            data={'text': 'обрезанный файл', 'image': truncated},
         )
+        self.assertEqual(Post.objects.count(), self.post_count)
+        self.assertImageError(response, 'invalid_image')
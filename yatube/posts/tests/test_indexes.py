@@ -0,0 +1,89 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow
+from .fixtures import ObjectsCreate, UsersCreate
+
+# Полный проход по таблице или сортировка во временном B-дереве вместо
+# чтения индекса в нужном порядке. До SQLite 3.36 план пишется как
+# «SCAN TABLE posts_post AS U0», начиная с неё — «SCAN U0»; проход по
+# индексу («USING [COVERING] INDEX») допустим.
+BAD_PLAN = re.compile(
+    r'^SCAN (?:TABLE )?\w+(?: AS \w+)?$|USE TEMP B-TREE'
+)
+
+
+class QueryPlanTest(TestCase):
+
+    def setUp(self):
+        self.author = UsersCreate.author_create()
+        self.user = UsersCreate.user_create()
+        self.client = UsersCreate.authorized_client_create(self.user)
+        self.group = ObjectsCreate.group_create()
+        Follow.objects.create(user=self.user, author=self.author)
+        for number in range(settings.POST_COUNT * 2):
+            post = ObjectsCreate.post_create(
+                self.group, self.author, f'пост {number}'
+            )
+        for number in range(settings.COMMENT_COUNT * 2):
+            Comment.objects.create(
+                post=post, author=self.user, text=f'комментарий {number}'
+            )
+        self.post = post
+
+    def bad_plans(self, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, data)
+        self.assertEqual(response.status_code, 200)
+        bad = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'posts_' not in sql:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                for row in cursor.fetchall():
+                    if BAD_PLAN.search(row[-1]):
+                        bad.append(f'{row[-1]}\n    {sql}')
+        return response, bad
+
+    def test_listing_queries_use_indexes(self):
+        paths = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for path in paths:
+            with self.subTest(path=path):
+                response, bad = self.bad_plans(path)
+                self.assertEqual(bad, [], '\n'.join(bad))
+                # Следующая страница идёт через курсор — другой запрос.
+                next_cursor = getattr(
+                    response.context.get('page_obj')
+                    or response.context.get('comments'),
+                    'next_cursor', None
+                )
+                if next_cursor:
+                    _, bad = self.bad_plans(path, {'cursor': next_cursor})
+                    self.assertEqual(bad, [], '\n'.join(bad))
+
+    @override_settings(TIMELINE_CELEBRITY_THRESHOLD=0)
+    def test_hybrid_feed_uses_indexes(self):
+        # Автор с подписчиками выше порога читается напрямую
+        # и сливается с раздачей.
+        response, bad = self.bad_plans(reverse('posts:follow_index'))
+        self.assertEqual(bad, [], '\n'.join(bad))
+        _, bad = self.bad_plans(
+            reverse('posts:follow_index'),
+            {'cursor': response.context['page_obj'].next_cursor},
+        )
+        self.assertEqual(bad, [], '\n'.join(bad))
@@ -1,7 +1,15 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from ..models import Group, Post
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -37,3 +45,152 @@ class GroupModelTest(TestCase):
         group = GroupModelTest.group
         group_str = group.__str__()
         self.assertEqual(group_str, group.title)
+
+
+class CountersTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.reader = User.objects.create(username='reader')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.other_group = Group.objects.create(title='Другая', slug='other')
+        self.post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+
+    def assertCounters(self, author_posts, group_posts, followers=0):
+        self.author.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, author_posts)
+        self.assertEqual(self.group.posts_count, group_posts)
+        self.assertEqual(self.author.stats.followers_count, followers)
+
+    def test_post_counters(self):
+        Post.objects.create(author=self.author, text='Ещё', group=self.group)
+        self.assertCounters(author_posts=2, group_posts=2)
+        self.post.delete()
+        self.assertCounters(author_posts=1, group_posts=1)
+
+    def test_post_moved_to_other_group(self):
+        self.post.group = self.other_group
+        self.post.save()
+        self.other_group.refresh_from_db()
+        self.assertCounters(author_posts=1, group_posts=0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+    def test_comment_and_follow_counters(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.post.refresh_from_db()
+        self.reader.stats.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+        self.assertCounters(author_posts=1, group_posts=1, followers=1)
+        comment.delete()
+        follow.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertCounters(author_posts=1, group_posts=1)
+
+    def test_reconcile_command_fixes_drift(self):
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=3)
+        AuthorStats.objects.filter(user=self.reader).delete()
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('4', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertTrue(AuthorStats.objects.filter(user=self.reader).exists())
+        self.assertCounters(author_posts=1, group_posts=1)
+
+    def test_drifted_counter_is_not_decremented_below_zero(self):
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        AuthorStats.objects.filter(user=self.author).update(posts_count=0)
+        self.post.delete()
+        self.assertCounters(author_posts=0, group_posts=0)
+
+    def test_raw_fixture_save_does_not_count_twice(self):
+        fixture = serializers.serialize('json', [self.post])
+        self.post.delete()
+        Group.objects.filter(pk=self.group.pk).update(posts_count=1)
+        AuthorStats.objects.filter(user=self.author).update(posts_count=1)
+        for obj in serializers.deserialize('json', fixture):
+            obj.save()
+        self.assertCounters(author_posts=1, group_posts=1)
+
+    def test_profile_shows_counter_without_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:profile', kwargs={'username': 'author'})
+            )
+        self.assertContains(response, 'Всего постов: 1')
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+
+
+class UpdatedAtTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.post = Post.objects.create(author=self.author, text='пост')
+        self.other = Post.objects.create(author=self.author, text='другой')
+        self.since = timezone.now()
+
+    def changed(self):
+        return list(Post.objects.changed_since(self.since))
+
+    def test_edit_and_comments_touch_post(self):
+        self.assertEqual(self.changed(), [])
+        self.post.text = 'исправлено'
+        self.post.save()
+        self.assertEqual(self.changed(), [self.post])
+
+        self.since = timezone.now()
+        comment = Comment.objects.create(
+            post=self.other, author=self.author, text='комментарий'
+        )
+        self.assertEqual(self.changed(), [self.other])
+
+        self.since = timezone.now()
+        comment.delete()
+        self.assertEqual(self.changed(), [self.other])
+
+    def test_changes_feed_resumes_from_last_seen(self):
+        Post.objects.update(updated_at=self.since)
+        url = reverse('posts:post_changes')
+        with self.settings(CHANGES_BATCH_SIZE=1):
+            params = {'since': (
+                self.since - timezone.timedelta(seconds=1)
+            ).isoformat()}
+            seen = []
+            while True:
+                data = self.client.get(url, params).json()
+                if not data['posts']:
+                    break
+                seen += [post['pk'] for post in data['posts']]
+                params = data['next']
+        self.assertEqual(seen, [self.post.pk, self.other.pk])
+
+    def test_changes_feed_requires_since(self):
+        response = self.client.get(reverse('posts:post_changes'))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse('posts:post_changes'), {'since': '2021-13-40T00:00'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_changes_feed_accepts_naive_since(self):
+        self.post.text = 'исправлено'
+        self.post.save()
+        naive = timezone.make_naive(self.since).isoformat()
+        data = self.client.get(
+            reverse('posts:post_changes'), {'since': naive}
+        ).json()
+        self.assertEqual(
+            [post['pk'] for post in data['posts']], [self.post.pk]
+        )
+        self.assertIs(data['deletions_reported'], False)
@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..search import fts_available, search_posts
+from .fixtures import UsersCreate, ObjectsCreate
+
+SEARCH = reverse('posts:search')
+
+
+class TestSearch(TestCase):
+
+    def setUp(self):
+        self.author = UsersCreate.author_create()
+        self.group = ObjectsCreate.group_create()
+        self.cars = ObjectsCreate.post_create(
+            None, self.author, 'Сегодня чинил автомобиль во дворе'
+        )
+        self.cars_twice = ObjectsCreate.post_create(
+            None, self.author, 'Автомобиль, автомобиль и снова автомобиль'
+        )
+        self.design = ObjectsCreate.post_create(
+            self.group, self.author, 'Про дизайн помещений'
+        )
+
+    def found(self, query, **params):
+        response = self.client.get(SEARCH, {'q': query, **params})
+        return response, list(response.context['page_obj'])
+
+    def test_fts_index_is_used(self):
+        self.assertTrue(fts_available())
+
+    def test_ranked_prefix_search(self):
+        response, posts = self.found('автомоб')
+        self.assertEqual(posts, [self.cars_twice, self.cars])
+        self.assertContains(response, 'во дворе')
+
+    def test_group_title_is_searchable(self):
+        self.assertEqual(self.found('group_title')[1], [self.design])
+
+    def test_index_follows_edits_and_deletes(self):
+        Post.objects.filter(pk=self.design.pk).update(text='Про автомобиль')
+        self.assertIn(self.design, self.found('автомобиль')[1])
+        Group.objects.filter(pk=self.group.pk).update(title='Машины')
+        self.assertEqual(self.found('машины')[1], [self.design])
+        self.cars.delete()
+        self.assertNotIn(self.cars, self.found('автомобиль')[1])
+
+    def test_query_syntax_is_escaped(self):
+        for query in ('"', 'OR', 'NEAR(', '*', ''):
+            with self.subTest(query=query):
+                response = self.client.get(SEARCH, {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(POST_COUNT=1)
+    def test_cursor_pagination_keeps_query(self):
+        response, posts = self.found('автомобиль')
+        self.assertEqual(posts, [self.cars_twice])
+        cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, 'q=%D0%B0%D0%B2')
+        response, posts = self.found('автомобиль', cursor=cursor)
+        self.assertEqual(posts, [self.cars])
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_admin_search_uses_fts(self):
+        request = RequestFactory().get('/admin/posts/post/')
+        queryset, distinct = site._registry[Post].get_search_results(
+            request, Post.objects.all(), 'дизайн'
+        )
+        self.assertEqual(list(queryset), [self.design])
+        self.assertFalse(distinct)
+
+    def test_search_without_fts_falls_back_to_icontains(self):
+        with mock.patch('posts.search.fts_available', return_value=False):
+            posts, _ = search_posts('дворе')
+            self.assertEqual(list(posts), [self.cars])
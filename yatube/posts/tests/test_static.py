@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import staticfiles
+from core.staticfiles import IMMUTABLE, REVALIDATE, StaticFilesApplication
+
+STATIC_ROOT = tempfile.mkdtemp()
+CSS = 'css/bootstrap.min.css'
+
+
+def not_found(environ, start_response):
+    start_response('404 Not Found', [])
+    return [b'django']
+
+
+@override_settings(
+    STATIC_ROOT=STATIC_ROOT,
+    STATICFILES_STORAGE='core.staticfiles.'
+                        'CompressedManifestStaticFilesStorage',
+)
+class StaticPipelineTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(STATIC_ROOT, 'staticfiles.json')) as file_:
+            cls.hashed = json.load(file_)['paths'][CSS]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(STATIC_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def request(self, path, **environ):
+        application = StaticFilesApplication(not_found)
+        environ.update(PATH_INFO=path)
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = status
+            response['headers'] = dict(headers)
+
+        body = b''.join(application(environ, start_response))
+        return response['status'], response['headers'], body
+
+    def test_hashed_names_and_compressed_copies(self):
+        """collectstatic кладёт рядом с файлами с хешем .gz (и .br)."""
+        self.assertNotEqual(self.hashed, CSS)
+        path = os.path.join(STATIC_ROOT, self.hashed)
+        self.assertTrue(os.path.exists(path + '.gz'))
+        if staticfiles.brotli is not None:
+            self.assertTrue(os.path.exists(path + '.br'))
+
+    def test_hashed_file_is_immutable_and_precompressed(self):
+        status, headers, body = self.request(
+            '/static/' + self.hashed, HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Cache-Control'], IMMUTABLE)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(headers['Content-Length']), len(body))
+        with open(os.path.join(STATIC_ROOT, self.hashed + '.gz'), 'rb') as f:
+            self.assertEqual(body, f.read())
+
+    @unittest.skipIf(staticfiles.brotli is None, 'нет модуля brotli')
+    def test_brotli_preferred(self):
+        _, headers, _ = self.request(
+            '/static/' + self.hashed, HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        self.assertEqual(headers['Content-Encoding'], 'br')
+
+    def test_unhashed_name_revalidated(self):
+        status, headers, _ = self.request(
+            '/static/' + CSS, HTTP_ACCEPT_ENCODING='gzip;q=0'
+        )
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Cache-Control'], REVALIDATE)
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_not_modified_and_head(self):
+        _, headers, _ = self.request('/static/' + self.hashed)
+        status, _, body = self.request(
+            '/static/' + self.hashed, HTTP_IF_NONE_MATCH=headers['ETag']
+        )
+        self.assertEqual((status, body), ('304 Not Modified', b''))
+        status, _, body = self.request(
+            '/static/' + self.hashed, REQUEST_METHOD='HEAD'
+        )
+        self.assertEqual((status, body), ('200 OK', b''))
+
+    def test_unknown_paths_go_to_application(self):
+        for path in ('/static/missing.css', '/static/../manage.py', '/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.request(path)[2], b'django')
+
+
+class StaticLinksTest(TestCase):
+
+    def test_each_asset_linked_once(self):
+        content = self.client.get(reverse('posts:index')).content.decode()
+        self.assertEqual(content.count('bootstrap.min.css'), 1)
+        self.assertNotIn('href="img/', content)
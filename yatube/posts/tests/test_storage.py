@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Post
+from .fixtures import UsersCreate
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TestContentAddressedStorage(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.author = UsersCreate.author_create()
+        self.storage = Post._meta.get_field('image').storage
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.storage.save('posts/cat.GIF', ContentFile(SMALL_GIF))
+        second = self.storage.save('posts/repost.gif', ContentFile(SMALL_GIF))
+        self.assertEqual(first, second)
+        self.assertTrue(self.storage.is_content_name(first))
+        prefix, shard_a, shard_b, filename = first.split('/')
+        self.assertEqual(prefix, 'posts')
+        self.assertEqual(filename[:4], shard_a + shard_b)
+        self.assertTrue(filename.endswith('.gif'))
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.storage.path(first))),
+            [filename],
+        )
+
+    def test_migrate_command_moves_and_deduplicates(self):
+        legacy = FileSystemStorage()
+        names = [
+            legacy.save(f'posts/legacy{number}.gif', ContentFile(SMALL_GIF))
+            for number in range(2)
+        ]
+        for name in names:
+            Post.objects.create(author=self.author, text=name, image=name)
+        Post.objects.create(
+            author=self.author, text='пропавший', image='posts/missing.gif'
+        )
+
+        call_command('migrate_post_images', stdout=open(os.devnull, 'w'),
+                     stderr=open(os.devnull, 'w'))
+
+        migrated = set(Post.objects.exclude(
+            text='пропавший'
+        ).values_list('image', flat=True))
+        self.assertEqual(len(migrated), 1)
+        self.assertTrue(self.storage.is_content_name(migrated.pop()))
+        for name in names:
+            self.assertFalse(legacy.exists(name))
+        self.assertEqual(
+            Post.objects.get(text='пропавший').image.name,
+            'posts/missing.gif',
+        )
@@ -0,0 +1,65 @@
+import importlib
+import os
+import runpy
+from unittest import mock
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.template import engines
+from django.test import SimpleTestCase, override_settings
+
+from core.warmup import warm_templates
+from yatube.settings import bench
+
+with mock.patch.dict(os.environ, YATUBE_SECRET_KEY='test-secret-key'):
+    prod = importlib.import_module('yatube.settings.prod')
+
+
+@override_settings(TEMPLATES=prod.TEMPLATES)
+class TemplateWarmupTest(SimpleTestCase):
+
+    def test_all_templates_compiled_into_cache(self):
+        """Прогрев кладёт в cached loader все шаблоны проекта."""
+        names = [
+            filename
+            for _, _, filenames in os.walk(settings.TEMPLATES_DIR)
+            for filename in filenames
+            if filename.endswith('.html')
+        ]
+        self.assertEqual(warm_templates(), len(names))
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertGreaterEqual(len(loader.get_template_cache), len(names))
+
+
+class SettingsProfilesTest(SimpleTestCase):
+
+    def test_prod_profile(self):
+        self.assertFalse(prod.DEBUG)
+        self.assertIn('django.middleware.gzip.GZipMiddleware', prod.MIDDLEWARE)
+        self.assertEqual(prod.DATABASES['default']['CONN_MAX_AGE'], 600)
+        self.assertEqual(
+            prod.CACHES['default']['BACKEND'],
+            'core.backends.cache.SQLiteCache',
+        )
+        self.assertNotEqual(
+            bench.CACHES['default']['LOCATION'],
+            prod.CACHES['default']['LOCATION'],
+        )
+
+    def test_prod_requires_secret_key(self):
+        self.assertEqual(prod.SECRET_KEY, 'test-secret-key')
+        with mock.patch.dict(os.environ), self.assertRaises(
+            ImproperlyConfigured
+        ):
+            os.environ.pop('YATUBE_SECRET_KEY', None)
+            runpy.run_module('yatube.settings.prod')
+        self.assertTrue(bench.SECRET_KEY)
+
+    def test_prod_does_not_leak_into_dev(self):
+        """Импорт prod не меняет настройки, с которыми идут тесты."""
+        self.assertTrue(settings.TEMPLATES[0]['APP_DIRS'])
+        self.assertNotIn('loaders', settings.TEMPLATES[0]['OPTIONS'])
+        self.assertNotIn(
+            'django.middleware.gzip.GZipMiddleware', settings.MIDDLEWARE
+        )
+        self.assertEqual(settings.DATABASES['default']['CONN_MAX_AGE'], 60)
@@ -0,0 +1,147 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import base
+
+from .. import thumbnails
+from ..models import Post
+from .fixtures import UsersCreate
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+INDEX = reverse('posts:index')
+PLACEHOLDER = 'img/placeholder.svg'
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class DeferredExecutor():
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn, args))
+
+    def run(self):
+        jobs, self.jobs = self.jobs, []
+        for fn, args in jobs:
+            fn(*args)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TestThumbnails(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = UsersCreate.guest_client_create()
+        self.post = Post.objects.create(
+            author=UsersCreate.author_create(),
+            text='пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    @override_settings(THUMBNAIL_ASYNC=True)
+    def test_placeholder_until_thumbnail_is_ready(self):
+        executor = DeferredExecutor()
+        with mock.patch.object(
+            thumbnails, 'get_executor', return_value=executor
+        ):
+            response = self.client.get(INDEX)
+            self.assertContains(response, PLACEHOLDER)
+            # Повторный запрос не ставит задачу второй раз.
+            cache.clear()
+            self.client.get(INDEX)
+            self.assertEqual(len(executor.jobs), 1)
+
+            executor.run()
+            response = self.client.get(INDEX)
+        self.assertNotContains(response, PLACEHOLDER)
+        thumbnail = thumbnails.get_thumbnail(self.post, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertContains(response, thumbnail.url)
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_sync_mode_renders_thumbnail(self):
+        response = self.client.get(INDEX)
+        self.assertNotContains(response, PLACEHOLDER)
+        self.assertContains(
+            response, thumbnails.get_thumbnail(self.post, 'card').url
+        )
+
+    @override_settings(
+        THUMBNAIL_ASYNC=False,
+        POST_THUMBNAIL_WIDTHS=(480, 1440),
+        POST_THUMBNAIL_FORMATS=('NOSUCHFORMAT', 'JPEG'),
+    )
+    def test_srcset_lists_every_width(self):
+        picture = thumbnails.get_thumbnail(self.post, 'card')
+        self.assertEqual(picture.sources, [])
+        widths = [
+            candidate.split()[1] for candidate in picture.srcset.split(', ')
+        ]
+        self.assertEqual(widths, ['480w', '960w', '1440w'])
+        self.assertEqual(list(picture.fallback.size), [960, 339])
+        response = self.client.get(INDEX)
+        self.assertContains(response, picture.srcset)
+
+    @override_settings(
+        THUMBNAIL_ASYNC=False, POST_THUMBNAIL_FORMATS=('NOSUCHFORMAT',),
+    )
+    def test_falls_back_to_jpeg_without_supported_formats(self):
+        picture = thumbnails.get_thumbnail(self.post, 'card')
+        self.assertTrue(picture.url.endswith('.jpg'))
+        self.assertEqual(picture.sources, [])
+
+    def test_avif_extension_without_patching_sorl(self):
+        name = thumbnails.lookup_backend.thumbnail_for(
+            self.post.image, '960x339', format='AVIF'
+        ).name
+        self.assertTrue(name.endswith('.avif'))
+        self.assertNotIn('AVIF', base.EXTENSIONS)
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_attach_resolves_page_with_one_lookup(self):
+        for number in range(3):
+            Post.objects.create(
+                author=self.post.author,
+                text=f'ещё пост {number}',
+                image=SimpleUploadedFile(
+                    f'small{number}.gif', SMALL_GIF, content_type='image/gif'
+                ),
+            )
+        Post.objects.create(author=self.post.author, text='без картинки')
+        posts = list(Post.objects.all())
+        for post in posts:
+            thumbnails.get_thumbnail(post, 'card')
+        cache.clear()
+
+        posts = list(Post.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.attach(posts)
+        self.assertEqual(len(queries), 1)
+        with self.assertNumQueries(0), mock.patch.object(
+            thumbnails.lookup_backend, 'get_many_cached_thumbnails'
+        ) as lookup:
+            for post in posts:
+                thumbnail = thumbnails.get_thumbnail(post, 'card')
+                self.assertEqual(thumbnail is None, not post.image)
+        lookup.assert_not_called()
@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post
+from ..utils import CursorPaginator
+from .fixtures import UsersCreate, ObjectsCreate
+
+INDEX = reverse('posts:index')
+
+
+class CursorPaginatorTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = UsersCreate.author_create()
+        self.group = ObjectsCreate.group_create()
+        for post_number in range(1, 24):
+            ObjectsCreate.post_create(
+                self.group, self.author, f'пост номер {post_number}'
+            )
+        self.expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+
+    def ids(self, page):
+        return [post.pk for post in page]
+
+    def test_walk_forward_and_back(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_cursor_page()
+        self.assertEqual(self.ids(first), self.expected[:10])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+        second = CursorPaginator(Post.objects.all(), 10).get_cursor_page(
+            first.next_cursor
+        )
+        self.assertEqual(second.number, 2)
+        self.assertEqual(self.ids(second), self.expected[10:20])
+
+        third = CursorPaginator(Post.objects.all(), 10).get_cursor_page(
+            second.next_cursor
+        )
+        self.assertEqual(self.ids(third), self.expected[20:])
+        self.assertFalse(third.has_next())
+        self.assertIsNone(third.next_cursor)
+
+        back = CursorPaginator(Post.objects.all(), 10).get_cursor_page(
+            third.previous_cursor
+        )
+        self.assertEqual(self.ids(back), self.expected[10:20])
+        self.assertTrue(back.has_previous())
+
+        start = CursorPaginator(Post.objects.all(), 10).get_cursor_page(
+            back.previous_cursor
+        )
+        self.assertEqual(start.number, 1)
+        self.assertEqual(self.ids(start), self.expected[:10])
+        self.assertFalse(start.has_previous())
+
+    def test_page_fetch_is_a_single_query(self):
+        cursor = CursorPaginator(Post.objects.all(), 10).get_cursor_page(
+        ).next_cursor
+        with self.assertNumQueries(1):
+            page = CursorPaginator(Post.objects.all(), 10).get_cursor_page(
+                cursor
+            )
+            page.has_next()
+            page.has_previous()
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        for cursor in ('garbage', 'e30', '!!!'):
+            with self.subTest(cursor=cursor):
+                page = CursorPaginator(
+                    Post.objects.all(), 10
+                ).get_cursor_page(cursor)
+                self.assertEqual(page.number, 1)
+                self.assertEqual(self.ids(page), self.expected[:10])
+
+    def test_views_follow_cursor_links(self):
+        response = self.client.get(INDEX)
+        cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?cursor={cursor}')
+        response = self.client.get(INDEX, {'cursor': cursor})
+        self.assertEqual(
+            self.ids(response.context['page_obj']), self.expected[10:20]
+        )
+
+    @override_settings(PAGINATOR_APPROXIMATE_TOTALS=True)
+    def test_approximate_totals(self):
+        response = self.client.get(INDEX)
+        self.assertEqual(
+            response.context['page_obj'].paginator.approximate_num_pages, 3
+        )
+        self.assertContains(response, 'из ~3')
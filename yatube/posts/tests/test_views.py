@@ -1,15 +1,21 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection
 
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 
-from ..models import Group, Post
-from .fixtures import UsersCreate, ObjectsCreate
+from .. import caching
+from ..models import Comment, Follow, Group, Post
+from .fixtures import QueryBudgetMixin, UsersCreate, ObjectsCreate
 
 
 User = get_user_model()
@@ -177,10 +183,52 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(response.context['page_obj']), values)
 
 
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.author = UsersCreate.author_create()
+        self.user = UsersCreate.user_create()
+        self.client = UsersCreate.authorized_client_create(self.user)
+        self.group = ObjectsCreate.group_create()
+        Follow.objects.create(user=self.user, author=self.author)
+        for number in range(settings.POST_COUNT + 1):
+            post = ObjectsCreate.post_create(
+                self.group, self.author, f'пост {number}'
+            )
+            Comment.objects.create(
+                post=post, author=self.user, text='комментарий'
+            )
+        for number in range(settings.POST_COUNT + 1):
+            Comment.objects.create(
+                post=post,
+                author=User.objects.create(username=f'reader_{number}'),
+                text='комментарий',
+            )
+        self.post = post
+
+    def test_listing_query_budgets(self):
+        # Группе, профилю и посту нужен ещё один короткий запрос до
+        # рендера: по нему считаются ETag и Last-Modified.
+        budgets = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 5,
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): 6,
+            reverse('posts:follow_index'): 4,
+            reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id}
+            ): 5,
+        }
+        for path, budget in budgets.items():
+            with self.subTest(path=path):
+                self.assertQueryBudget(self.client, path, budget)
+
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
 class PictureTest(TestCase):
 
     @classmethod
@@ -251,6 +299,7 @@ class PictureTest(TestCase):
 class TestCache(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.post_author = UsersCreate.author_create()
         self.AUTHOR = UsersCreate.authorized_author_client_create(
             self.post_author
@@ -259,14 +308,301 @@ class TestCache(TestCase):
         self.POST = ObjectsCreate.post_create(
             self.GROUP, self.post_author, TEXT
         )
+        self.PATHS = (
+            INDEX,
+            reverse('posts:group_list', kwargs={'slug': self.GROUP.slug}),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.post_author.username}
+            ),
+        )
 
     def test_cache(self):
-        response = self.AUTHOR.get(INDEX)
-        image_of_page_BEFORE_post_delete = response.content
-        post_to_delete = Post.objects.first()
-        post_to_delete.delete()
-        response = self.AUTHOR.get(INDEX)
-        image_of_page_AFTER_post_delete = response.content
-        self.assertEqual(
-            image_of_page_BEFORE_post_delete, image_of_page_AFTER_post_delete
+        for path in self.PATHS:
+            with self.subTest(path=path):
+                response = self.AUTHOR.get(path)
+                image_of_page_BEFORE_update = response.content
+                # update() не шлёт сигналов, поэтому страница из кеша
+                Post.objects.filter(pk=self.POST.pk).update(text='новый')
+                response = self.AUTHOR.get(path)
+                self.assertEqual(
+                    image_of_page_BEFORE_update, response.content
+                )
+                Post.objects.filter(pk=self.POST.pk).update(text=TEXT)
+
+    def test_cache_is_invalidated_on_post_delete(self):
+        for path in self.PATHS:
+            with self.subTest(path=path):
+                self.assertContains(self.AUTHOR.get(path), TEXT)
+        Post.objects.first().delete()
+        for path in self.PATHS:
+            with self.subTest(path=path):
+                self.assertNotContains(self.AUTHOR.get(path), TEXT)
+
+    def test_cache_is_invalidated_on_post_edit_and_comment(self):
+        self.AUTHOR.get(INDEX)
+        self.POST.text = 'исправленный текст'
+        self.POST.save()
+        self.assertContains(self.AUTHOR.get(INDEX), 'исправленный текст')
+        key = self.AUTHOR.get(INDEX).context['listing_key']
+        Comment.objects.create(
+            post=self.POST, author=self.post_author, text='комментарий'
+        )
+        self.assertNotEqual(
+            self.AUTHOR.get(INDEX).context['listing_key'], key
+        )
+
+    def test_warm_listing_skips_page_queries(self):
+        """Если фрагмент ленты в кеше, страница постов не запрашивается."""
+        for path in (*self.PATHS, reverse('posts:search')):
+            with self.subTest(path=path):
+                params = {'q': TEXT} if 'search' in path else {}
+                self.assertContains(self.AUTHOR.get(path, params), TEXT)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.AUTHOR.get(path, params)
+                self.assertContains(response, TEXT)
+                self.assertFalse([
+                    query['sql'] for query in queries
+                    if 'FROM "posts_post"' in query['sql']
+                ])
+
+    def test_forged_positions_are_not_cached(self):
+        """Чужие курсоры и дальние номера страниц не создают ключей."""
+        for number in range(settings.POST_COUNT):
+            ObjectsCreate.post_create(
+                self.GROUP, self.post_author, f'пост {number}'
+            )
+        cursor = self.AUTHOR.get(INDEX).context['page_obj'].next_cursor
+        self.assertIsNotNone(
+            self.AUTHOR.get(INDEX, {'cursor': cursor}).context['listing_key']
+        )
+        self.assertIsNotNone(
+            self.AUTHOR.get(INDEX, {'page': 2}).context['listing_key']
+        )
+        for params in (
+            {'cursor': cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')},
+            {'cursor': 'random'},
+            {'page': 10 ** 6},
+            {'page': 'last'},
+        ):
+            with self.subTest(params=params):
+                response = self.AUTHOR.get(INDEX, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(response.context['listing_key'])
+
+    def test_cache_key_depends_on_page(self):
+        for number in range(settings.POST_COUNT):
+            ObjectsCreate.post_create(
+                self.GROUP, self.post_author, f'пост {number}'
+            )
+        first_page = self.AUTHOR.get(INDEX).content
+        second_page = self.AUTHOR.get(INDEX, {'page': 2}).content
+        self.assertNotEqual(first_page, second_page)
+        self.assertIn(TEXT.encode(), second_page)
+
+
+class TestPostCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = UsersCreate.author_create()
+        self.author_client = UsersCreate.authorized_author_client_create(
+            self.author
+        )
+        self.post = ObjectsCreate.post_create(
+            ObjectsCreate.group_create(), self.author, TEXT
+        )
+        self.readers = []
+        for number in range(2):
+            user = User.objects.create(username=f'reader{number}')
+            Follow.objects.create(user=user, author=self.author)
+            self.readers.append(
+                UsersCreate.authorized_client_create(user)
+            )
+        self.detail = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        self.edit = reverse(
+            'posts:post_edit', kwargs={'post_id': self.post.pk}
+        )
+
+    def test_cards_shared_between_users(self):
+        """Карточка, отрендеренная для одного, достаётся из кеша другому."""
+        for path in (self.detail, reverse('posts:follow_index')):
+            with self.subTest(path=path):
+                self.assertContains(self.readers[0].get(path), TEXT)
+                # update() не шлёт сигналов, и версия поста не меняется
+                Post.objects.filter(pk=self.post.pk).update(text='новый')
+                self.assertContains(self.readers[1].get(path), TEXT)
+                Post.objects.filter(pk=self.post.pk).update(text=TEXT)
+
+    def test_card_shared_between_listings(self):
+        """Карточка из одной ленты переиспользуется в остальных."""
+        self.assertContains(self.readers[0].get(INDEX), TEXT)
+        Post.objects.filter(pk=self.post.pk).update(text='новый')
+        # Сбрасываем ленты, но не версию поста: страницы рендерятся
+        # заново, а карточка берётся из кеша.
+        caching.bump(*caching.post_scopes(
+            self.post.group_id, self.author.pk
+        ))
+        for path in (
+            INDEX,
+            reverse('posts:follow_index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+        ):
+            with self.subTest(path=path):
+                response = self.readers[1].get(path)
+                self.assertContains(response, TEXT)
+                self.assertNotContains(response, 'новый')
+
+    def test_personal_parts_not_cached(self):
+        """Ссылка на правку и форма комментария — свои у каждого."""
+        reader = self.readers[0].get(self.detail)
+        author = self.author_client.get(self.detail)
+        self.assertNotContains(reader, self.edit)
+        self.assertContains(author, self.edit)
+        self.assertContains(reader, 'csrfmiddlewaretoken')
+        self.assertNotContains(
+            UsersCreate.guest_client_create().get(self.detail),
+            'csrfmiddlewaretoken',
+        )
+
+    def test_card_invalidated_on_edit_and_comment(self):
+        self.readers[0].get(self.detail)
+        self.post.text = 'исправленный текст'
+        self.post.save()
+        self.assertContains(
+            self.readers[1].get(self.detail), 'исправленный текст'
+        )
+        Comment.objects.create(
+            post=self.post, author=self.author, text='комментарий'
+        )
+        self.assertContains(
+            self.readers[1].get(self.detail), 'Комментариев: 1'
+        )
+
+    def test_stale_card_is_not_cached_inside_listing(self):
+        """Лента со старой карточкой не кешируется под новой версией."""
+        self.readers[0].get(INDEX)
+        self.post.text = 'исправленный текст'
+        self.post.save()
+        post = Post.objects.get(pk=self.post.pk)
+        caching.attach_versions([post])
+        # Карточку пересчитывает другой запрос.
+        lock = caching.LOCK_KEY.format(
+            make_template_fragment_key('post_card', [post.cache_version])
+        )
+        cache.add(lock, True)
+        response = self.readers[0].get(INDEX)
+        self.assertContains(response, TEXT)
+        cache.delete(lock)
+        self.assertContains(
+            self.readers[0].get(INDEX), 'исправленный текст'
+        )
+
+    def test_cards_show_renamed_author(self):
+        paths = (
+            INDEX,
+            self.detail,
+            reverse('posts:follow_index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+        )
+        for path in paths:
+            self.readers[0].get(path)
+        self.author.first_name = 'Лев'
+        self.author.last_name = 'Толстой'
+        self.author.save()
+        for path in paths:
+            with self.subTest(path=path):
+                self.assertContains(self.readers[1].get(path), 'Лев Толстой')
+
+    def test_login_does_not_reset_listings(self):
+        self.author.set_password('password')
+        self.author.save()
+        versions = caching.get_versions([caching.ALL])
+        self.assertTrue(self.client.login(
+            username=self.author.username, password='password'
+        ))
+        self.assertEqual(caching.get_versions([caching.ALL]), versions)
+
+
+class TestConditionalGet(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = UsersCreate.author_create()
+        self.group = ObjectsCreate.group_create()
+        self.post = ObjectsCreate.post_create(self.group, self.author, TEXT)
+        self.guest = UsersCreate.guest_client_create()
+        self.paths = (
+            INDEX,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_not_modified_until_content_changes(self):
+        etags = {}
+        for path in self.paths:
+            with self.subTest(path=path):
+                response = self.guest.get(path)
+                self.assertTrue(response.has_header('Last-Modified'))
+                etags[path] = response['ETag']
+                response = self.guest.get(path, HTTP_IF_NONE_MATCH=etags[path])
+                self.assertEqual(response.status_code, 304)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='комментарий'
+        )
+        for path in self.paths:
+            with self.subTest(path=path):
+                response = self.guest.get(path, HTTP_IF_NONE_MATCH=etags[path])
+                self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        path = self.paths[1]
+        last_modified = self.guest.get(path)['Last-Modified']
+        response = self.guest.get(path, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_viewer(self):
+        user = UsersCreate.user_create()
+        client = UsersCreate.authorized_client_create(user)
+        path = self.paths[2]
+        etag = self.guest.get(path)['ETag']
+        response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+        Follow.objects.create(user=user, author=self.author)
+        response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_stale_fragment_is_sent_without_validators(self):
+        """Прошлую версию ленты нельзя подтверждать новыми валидаторами."""
+        self.guest.get(INDEX)
+        caching.bump(caching.INDEX)
+        # Блокировку пересчёта держит другой запрос.
+        with mock.patch.object(cache, 'add', return_value=False):
+            response = self.guest.get(INDEX)
+        self.assertContains(response, TEXT)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        response = self.guest.get(INDEX)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Cache-Control'))
+
+    def test_authorized_index_is_not_conditional(self):
+        client = UsersCreate.authorized_client_create(
+            UsersCreate.user_create()
         )
+        self.assertFalse(client.get(INDEX).has_header('ETag'))
@@ -0,0 +1,285 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from PIL import Image
+from sorl.thumbnail import base, default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from . import caching
+
+try:
+    # Необязательный плагин Pillow с кодеком AVIF.
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+class PostThumbnailBackend(ThumbnailBackend):
+    """ThumbnailBackend, который знает расширение файлов AVIF.
+
+    sorl-thumbnail берёт расширение файла из своего словаря
+    EXTENSIONS, где AVIF нет. Схема имени та же, что у sorl, поэтому
+    уже сгенерированные миниатюры остаются на своих местах.
+    """
+
+    extensions = {**base.EXTENSIONS, 'AVIF': 'avif'}
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        return (
+            f'{thumbnail_settings.THUMBNAIL_PREFIX}{key[:2]}/{key[2:4]}/'
+            f'{key}.{self.extensions[options["format"]]}'
+        )
+
+
+class LookupBackend(PostThumbnailBackend):
+    """Находит уже готовую миниатюру, ничего не генерируя."""
+
+    def _options(self, source, options):
+        # Те же умолчания, что и в ThumbnailBackend.get_thumbnail,
+        # иначе имя файла миниатюры не совпадёт.
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_for(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        options = self._options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def _get_many_raw(self, keys):
+        kvstore = default.kvstore
+        if not hasattr(kvstore, 'cache'):
+            return {key: kvstore._get_raw(key) for key in keys}
+        values = kvstore.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            stored = dict(KVStore.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            # Как и cached_db_kvstore, запоминаем в кеше и отсутствие
+            # записи, чтобы не ходить за ней в базу на каждой странице.
+            found = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+            kvstore.cache.set_many(
+                found, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            values.update(found)
+        return {
+            key: None if value == EMPTY_VALUE else value
+            for key, value in values.items()
+        }
+
+    def get_many_cached_thumbnails(self, items):
+        """Готовые миниатюры для списка (файл, геометрия, опции).
+
+        Для отсутствующих миниатюр в результате None.
+        """
+        keys = [
+            add_prefix(self.thumbnail_for(
+                file_, geometry_string, **options
+            ).key)
+            for file_, geometry_string, options in items
+        ]
+        values = self._get_many_raw(keys)
+        return [
+            deserialize_image_file(values[key]) if values.get(key) else None
+            for key in keys
+        ]
+
+
+lookup_backend = LookupBackend()
+
+
+class Picture():
+    """Все готовые варианты миниатюры для тега <picture>."""
+
+    def __init__(self, fallback, srcset, sources):
+        self.fallback = fallback
+        self.url = fallback.url
+        self.srcset = srcset
+        self.sources = sources
+
+
+def supported_formats():
+    """Форматы из POST_THUMBNAIL_FORMATS, которые умеет сохранять Pillow.
+
+    Если не подошёл ни один, миниатюры делаются в JPEG.
+    """
+    Image.init()
+    return [
+        format_ for format_ in settings.POST_THUMBNAIL_FORMATS
+        if format_ in Image.SAVE
+    ] or ['JPEG']
+
+
+def variants(size):
+    """Варианты размера size: (формат, ширина, геометрия, опции).
+
+    Последний поддерживаемый формат из POST_THUMBNAIL_FORMATS считается
+    запасным для браузеров без современных кодеков.
+    """
+    geometry, options = settings.POST_THUMBNAILS[size]
+    width, height = (int(side) for side in geometry.split('x'))
+    widths = sorted({width, *settings.POST_THUMBNAIL_WIDTHS})
+    result = []
+    for format_ in supported_formats():
+        for variant_width in widths:
+            variant_options = dict(options, format=format_)
+            quality = settings.POST_THUMBNAIL_QUALITY.get(format_)
+            if quality:
+                variant_options['quality'] = quality
+            variant_height = round(height * variant_width / width)
+            result.append((
+                format_,
+                variant_width,
+                f'{variant_width}x{variant_height}',
+                variant_options,
+            ))
+    return result
+
+
+def generate(source, scopes=()):
+    try:
+        for size in settings.POST_THUMBNAILS:
+            for _, _, geometry, options in variants(size):
+                default.backend.get_thumbnail(source, geometry, **options)
+        # Ленты могли закешироваться с заглушкой вместо картинки.
+        caching.bump(*scopes)
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить миниатюры для %s', source.name
+        )
+    finally:
+        _pending.discard(source.name)
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def enqueue(post):
+    """Ставит генерацию всех размеров в очередь (или делает сразу)."""
+    name = post.image.name
+    if not name:
+        return
+    # Ключ миниатюры зависит от хранилища исходника, поэтому передаём
+    # его вместе с именем, а не одну строку.
+    source = ImageFile(name, post.image.storage)
+    if not settings.THUMBNAIL_ASYNC:
+        generate(source)
+        return
+    with _executor_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    scopes = caching.post_scopes(post.group_id, post.author_id)
+    get_executor().submit(generate, source, scopes)
+
+
+def _missing(post, size_variants, found):
+    if settings.THUMBNAIL_ASYNC:
+        enqueue(post)
+        return found
+    return [
+        thumbnail or default.backend.get_thumbnail(
+            post.image, geometry, **options
+        )
+        for thumbnail, (_, _, geometry, options) in zip(found, size_variants)
+    ]
+
+
+def _picture(size, size_variants, found):
+    if not size_variants:
+        return None
+    base_width = int(settings.POST_THUMBNAILS[size][0].split('x')[0])
+    fallback_format = size_variants[-1][0]
+    srcsets = {}
+    fallback = None
+    for thumbnail, (format_, width, _, _) in zip(found, size_variants):
+        if thumbnail is None:
+            continue
+        srcsets.setdefault(format_, []).append(f'{thumbnail.url} {width}w')
+        if format_ == fallback_format and width == base_width:
+            fallback = thumbnail
+    if fallback is None:
+        return None
+    sources = [
+        (MIME_TYPES.get(format_, ''), ', '.join(srcset))
+        for format_, srcset in srcsets.items()
+        if format_ != fallback_format
+    ]
+    return Picture(
+        fallback, ', '.join(srcsets[fallback_format]), sources
+    )
+
+
+def attach(posts, size='card'):
+    """Находит миниатюры для всей страницы постов одним get_many.
+
+    Результат кладётся в post.thumbnails, и тег post_thumbnail
+    берёт его оттуда, не обращаясь к хранилищу.
+    """
+    posts = list(posts)
+    with_image = [post for post in posts if post.image]
+    size_variants = variants(size)
+    found = lookup_backend.get_many_cached_thumbnails([
+        (post.image, geometry, options)
+        for post in with_image
+        for _, _, geometry, options in size_variants
+    ]) if with_image else []
+    pictures = {}
+    step = len(size_variants)
+    for index, post in enumerate(with_image):
+        post_found = found[index * step:(index + 1) * step]
+        if None in post_found:
+            post_found = _missing(post, size_variants, post_found)
+        pictures[post.pk] = _picture(size, size_variants, post_found)
+    for post in posts:
+        if not hasattr(post, 'thumbnails'):
+            post.thumbnails = {}
+        post.thumbnails[size] = pictures.get(post.pk)
+
+
+def get_thumbnail(post, size):
+    """Готовая миниатюра (Picture) или None, пока она генерируется в фоне."""
+    if size not in getattr(post, 'thumbnails', {}):
+        attach([post], size)
+    return post.thumbnails[size]
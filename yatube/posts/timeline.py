@@ -0,0 +1,174 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+# Ключи keyset-пагинации ленты. Раздаваемые посты сортируются по копии
+# pub_date в TimelineEntry, чтобы страница читалась из её индекса,
+# а не сортировалась после соединения с posts_post.
+FEED_KEY = {'key_field': 'feed_date', 'pk_field': 'feed_id'}
+
+
+def by_post(posts):
+    """Ключи ленты для постов, которые читаются напрямую, без раздачи."""
+    return posts.annotate(feed_date=F('pub_date'), feed_id=F('pk'))
+
+
+def follower_count(author_id):
+    count = AuthorStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if count is None:
+        count = Follow.objects.filter(author_id=author_id).count()
+    return count
+
+
+def is_celebrity(author_id):
+    # Посты авторов с числом подписчиков больше порога не раздаются
+    # по лентам при записи, а подмешиваются при чтении.
+    threshold = settings.TIMELINE_CELEBRITY_THRESHOLD
+    return threshold is not None and follower_count(author_id) > threshold
+
+
+def followed_celebrities(user_id):
+    threshold = settings.TIMELINE_CELEBRITY_THRESHOLD
+    if threshold is None:
+        return []
+    followed = Follow.objects.filter(user_id=user_id).values('author_id')
+    return list(AuthorStats.objects.filter(
+        user_id__in=followed, followers_count__gt=threshold
+    ).values_list('user_id', flat=True))
+
+
+def _entries(user_id, posts):
+    return [
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    ]
+
+
+def trim_many(user_ids):
+    """Оставляет в каждой ленте TIMELINE_LENGTH последних записей.
+
+    Один DELETE на пачку лент: номер записи внутри ленты считает
+    оконная функция, а не отдельный запрос на каждого подписчика.
+    """
+    table = TimelineEntry._meta.db_table
+    user_ids = list(user_ids)
+    batch_size = settings.TIMELINE_BATCH_SIZE
+    with connection.cursor() as cursor:
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ('
+                'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+                'PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC'
+                f') AS position FROM {table} WHERE user_id IN '
+                f'({", ".join(["%s"] * len(batch))})'
+                ') WHERE position > %s)',
+                [*batch, settings.TIMELINE_LENGTH],
+            )
+
+
+def trim(user_id):
+    trim_many([user_id])
+
+
+def fan_out(post):
+    if is_celebrity(post.author_id):
+        return
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim_many(followers)
+
+
+def backfill(user_id, author_id):
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        _entries(user_id, posts),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def remove_author(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def demote(author_id):
+    """Раздаёт свежие посты автора, опустившегося до порога.
+
+    Его посты ещё не лежат в лентах подписчиков. Все пары
+    «подписчик × пост» вставляются одним INSERT … SELECT, а не
+    backfill на каждого подписчика: иначе одна отписка стоила бы
+    нескольких тысяч запросов.
+    """
+    table = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, post_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.pub_date '
+            f'FROM {Follow._meta.db_table} AS follow, ('
+            f'SELECT id, pub_date FROM {Post._meta.db_table} '
+            'WHERE author_id = %s ORDER BY pub_date DESC, id DESC LIMIT %s'
+            ') AS post WHERE follow.author_id = %s '
+            'ON CONFLICT (user_id, post_id) DO NOTHING',
+            [author_id, settings.TIMELINE_LENGTH, author_id],
+        )
+    trim_many(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+
+
+def rebuild(user_id):
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    authors = Follow.objects.filter(user_id=user_id).exclude(
+        author_id__in=followed_celebrities(user_id)
+    ).values('author_id')
+    posts = Post.objects.filter(author_id__in=authors).order_by(
+        '-pub_date', '-pk'
+    ).values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        _entries(user_id, posts),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+    )
+
+
+def feed(user):
+    """Лента подписок: queryset для ?page=N и источники для k-way слияния.
+
+    Страницу собирает page_obj_gen(..., **FEED_KEY).
+    """
+    listing = Post.objects.for_listing()
+    pushed = listing.filter(timeline__user=user).annotate(
+        feed_date=F('timeline__pub_date'), feed_id=F('timeline__post_id')
+    )
+    celebrities = followed_celebrities(user.pk)
+    if not celebrities:
+        return pushed, None
+    pulled = [
+        by_post(listing.filter(author_id=author_id))
+        for author_id in celebrities
+    ]
+    posts = listing.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=celebrities)
+    )
+    return posts, [pushed.exclude(author_id__in=celebrities)] + pulled
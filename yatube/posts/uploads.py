@@ -0,0 +1,86 @@
+import warnings
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import (
+    StopUpload, TemporaryFileUploadHandler,
+)
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку на диск и обрывает её после POST_IMAGE_MAX_BYTES.
+
+    Остаток тела запроса не читается, а имя поля попадает
+    в request.oversized_uploads, чтобы форма объяснила отказ.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        if request is not None:
+            request.oversized_uploads = set()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            if self.request is not None:
+                self.request.oversized_uploads.add(self.field_name)
+            raise StopUpload(connection_reset=True)
+        self.file.write(raw_data)
+
+
+def bounded_uploads(view):
+    """Ставит BoundedUploadHandler первым обработчиком загрузок view.
+
+    Обработчики можно менять только до чтения request.POST, а его
+    читает CsrfViewMiddleware. Поэтому middleware view пропускает,
+    а CSRF проверяется внутри, уже после замены.
+    """
+    protected_view = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, BoundedUploadHandler(request))
+        return protected_view(request, *args, **kwargs)
+    return wrapper
+
+
+def file_too_large():
+    return ValidationError(
+        'Файл слишком большой: не больше %(limit)s МБ.',
+        code='file_too_large',
+        params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+    )
+
+
+def validate_image_upload(upload):
+    """Проверяет размер файла и число пикселей по одному заголовку."""
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise file_too_large()
+    upload.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            # Image.open читает только заголовок, пиксели не декодируются.
+            with Image.open(upload) as image:
+                width, height = image.size
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        width, height = float('inf'), 1
+    except Exception:
+        # Не картинка: это сообщит стандартная проверка ImageField.
+        return
+    finally:
+        upload.seek(0)
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большое изображение: не больше %(limit)s Мпикс.',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
@@ -1,9 +1,221 @@
-from django.core.paginator import Paginator
+import base64
+import hashlib
+import heapq
+import itertools
+import json
+
 from django.conf import settings
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import caching
+
+NEXT = 'next'
+PREVIOUS = 'prev'
+# Курсоры подписаны: выдуманный клиентом курсор не открывает новую
+# страницу и не плодит ключи фрагментов в кеше.
+_cursor_signer = signing.Signer(salt='posts.cursor')
+
+
+def encode_cursor(value, pk, number, direction):
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    payload = json.dumps(
+        [value, pk, number, direction], separators=(',', ':')
+    )
+    return _cursor_signer.sign(
+        base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+    )
+
+
+def is_signed_cursor(cursor):
+    try:
+        _cursor_signer.unsign(cursor)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def decode_cursor(cursor, parse_value=parse_datetime):
+    # Битый или чужой курсор не должен ронять страницу:
+    # в этом случае просто отдаём первую страницу ленты.
+    try:
+        cursor = _cursor_signer.unsign(cursor)
+    except signing.BadSignature:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk, number, direction = json.loads(
+            base64.urlsafe_b64decode(padded.encode()).decode()
+        )
+        value = parse_value(value)
+        pk, number = int(pk), int(number)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if value is None or direction not in (NEXT, PREVIOUS):
+        return None
+    return value, pk, number, direction
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинатор по паре (key_field, pk) вместо OFFSET/LIMIT.
+
+    Страница получается одним запросом с LIMIT per_page + 1 при любой
+    глубине; COUNT(*) выполняется только при with_count=True и кешируется.
+    Обычный get_page(number) по-прежнему работает для ссылок ?page=N.
+    Если переданы sources, keyset-страница собирается слиянием этих
+    querysets, а object_list используется только для ?page=N и COUNT(*).
+    pk_field задаёт второй ключ сортировки, если вместо pk удобнее
+    сортировать по полю из той же таблицы, что и key_field.
+    """
+
+    def __init__(self, object_list, per_page, key_field='pub_date',
+                 with_count=False, sources=None, count=None, pk_field='pk',
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            # Известное заранее число (денормализованный счётчик)
+            # избавляет от COUNT(*) и в ?page=N, и в примерных итогах.
+            self.count = self.approximate_count = count
+        self.key_field = key_field
+        self.pk_field = pk_field
+        self.sources = sources
+        self.with_count = with_count
+        self.keyset = False
+        self._keyset_num_pages = None
 
+    @property
+    def num_pages(self):
+        # В keyset-режиме число страниц неизвестно, достаточно знать,
+        # есть ли следующая: так Page.has_next() и т.п. работают как обычно.
+        if self.keyset:
+            return self._keyset_num_pages
+        return self._offset_num_pages
 
-def page_obj_gen(request, posts):
-    paginator = Paginator(posts, settings.POST_COUNT)
+    @cached_property
+    def _offset_num_pages(self):
+        return Paginator.num_pages.func(self)
+
+    @cached_property
+    def approximate_count(self):
+        query = str(self.object_list.query).encode()
+        key = 'paginator_count:' + hashlib.md5(query).hexdigest()
+        return caching.get_or_compute(
+            key, self.object_list.count, settings.PAGINATOR_COUNT_TIMEOUT
+        )
+
+    @property
+    def approximate_num_pages(self):
+        count = max(self.approximate_count - self.orphans, 1)
+        return -(-count // self.per_page)
+
+    def parse_value(self, value):
+        return parse_datetime(value)
+
+    def _ordered(self, queryset, descending):
+        prefix = '-' if descending else ''
+        return queryset.order_by(
+            prefix + self.key_field, prefix + self.pk_field
+        )
+
+    def _seek(self, queryset, value, pk, direction):
+        key_field, pk_field = self.key_field, self.pk_field
+        if direction == NEXT:
+            return self._ordered(queryset, descending=True).filter(
+                Q(**{key_field + '__lt': value})
+                | Q(**{key_field: value, pk_field + '__lt': pk})
+            )
+        return self._ordered(queryset, descending=False).filter(
+            Q(**{key_field + '__gt': value})
+            | Q(**{key_field: value, pk_field + '__gt': pk})
+        )
+
+    def _key(self, obj):
+        return getattr(obj, self.key_field), getattr(obj, self.pk_field)
+
+    def _fetch(self, bound, direction, limit):
+        if self.sources is None:
+            querysets = [self.object_list]
+        else:
+            querysets = self.sources
+        if bound is None:
+            chunks = [
+                self._ordered(queryset, descending=True)[:limit]
+                for queryset in querysets
+            ]
+        else:
+            chunks = [
+                self._seek(queryset, *bound, direction)[:limit]
+                for queryset in querysets
+            ]
+        if len(chunks) == 1:
+            return list(chunks[0])
+        # k-way слияние уже отсортированных источников: из каждого берём
+        # не больше limit строк, поэтому цена страницы не зависит от глубины.
+        merged = heapq.merge(
+            *chunks,
+            key=self._key,
+            reverse=direction == NEXT,
+        )
+        return list(itertools.islice(merged, limit))
+
+    def _cursor_for(self, obj, number, direction):
+        return encode_cursor(*self._key(obj), number, direction)
+
+    def get_cursor_page(self, cursor=None):
+        decoded = decode_cursor(cursor, self.parse_value) if cursor else None
+        if decoded is None:
+            items = self._fetch(None, NEXT, self.per_page + 1)
+            number, has_previous = 1, False
+            has_next = len(items) > self.per_page
+            items = items[:self.per_page]
+        else:
+            value, pk, number, direction = decoded
+            items = self._fetch((value, pk), direction, self.per_page + 1)
+            has_more = len(items) > self.per_page
+            items = items[:self.per_page]
+            if direction == NEXT:
+                has_previous, has_next = True, has_more
+            else:
+                items.reverse()
+                has_previous, has_next = has_more, True
+            number = max(number, 2) if has_previous else 1
+
+        self.keyset = True
+        self._keyset_num_pages = number + 1 if has_next else number
+        page = self._get_page(items, number, self)
+        page.next_cursor = page.previous_cursor = None
+        if items and has_next:
+            page.next_cursor = self._cursor_for(items[-1], number + 1, NEXT)
+        if items and has_previous:
+            page.previous_cursor = self._cursor_for(
+                items[0], number - 1, PREVIOUS
+            )
+        return page
+
+
+def page_obj_gen(request, posts, sources=None, count=None,
+                 paginator_class=CursorPaginator, **paginator_kwargs):
+    paginator = paginator_class(
+        posts, settings.POST_COUNT,
+        with_count=settings.PAGINATOR_APPROXIMATE_TOTALS,
+        sources=sources,
+        count=count,
+        **paginator_kwargs
+    )
+    cursor = request.GET.get('cursor')
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None and cursor is None:
+        return paginator.get_page(page_number)
+    return paginator.get_cursor_page(cursor)
+
+
+def comments_page_gen(request, post):
+    paginator = CursorPaginator(
+        post.comments.with_author(), settings.COMMENT_COUNT,
+        key_field='created',
+    )
+    return paginator.get_cursor_page(request.GET.get('cursor'))
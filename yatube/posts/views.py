@@ -1,15 +1,47 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
 from django.shortcuts import redirect, render
 from django.shortcuts import get_object_or_404
 
+from core.replicas import read_from_replica
+
+from . import caching, counters, thumbnails, timeline
+from .conditional import (
+    group_scopes, index_scopes, listing_condition, post_detail_scopes,
+    profile_scopes,
+)
 from .forms import PostForm, CommentForm
+from .search import search_posts
+from .uploads import bounded_uploads
 from .models import Follow, Post, Group, User
-from .utils import page_obj_gen
+from .utils import comments_page_gen, page_obj_gen
+
+
+def _lazy_page(request, posts, **kwargs):
+    """Страница ленты, которая собирается при первом обращении.
 
+    page_obj читается только внутри {% listing_cache %}, поэтому, если
+    фрагмент ленты уже в кеше, ни запроса страницы, ни поиска миниатюр
+    и версий карточек не будет.
+    """
+    def build():
+        page_obj = page_obj_gen(request, posts, **kwargs)
+        thumbnails.attach(page_obj)
+        caching.attach_versions(page_obj)
+        return page_obj
+    return SimpleLazyObject(build)
 
+
+@read_from_replica
+@listing_condition(index_scopes)
 def index(request):
-    posts = Post.objects.all().select_related('group')
-    page_obj = page_obj_gen(request, posts)
+    posts = Post.objects.for_listing()
+    page_obj = _lazy_page(request, posts)
     follow = request.user.is_authenticated
     title = 'Последние обновления на сайте'
     context = {
@@ -17,27 +49,40 @@ def index(request):
         'title': title,
         'index': True,
         'follow': follow,
+        'listing_key': caching.listing_key(request, caching.INDEX),
+        'listing_timeout': settings.LISTING_CACHE_TIMEOUT,
     }
     return render(request, 'posts/index.html', context)
 
 
+@read_from_replica
+@listing_condition(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     title = f'Записи сообщества {group.title}'
-    posts = group.posts.all()
-    page_obj = page_obj_gen(request, posts)
+    posts = group.posts.for_listing()
+    page_obj = _lazy_page(request, posts, count=group.posts_count)
     context = {
         'group': group,
         'title': title,
         'page_obj': page_obj,
+        'listing_key': caching.listing_key(
+            request, caching.group_scope(group.pk)
+        ),
+        'listing_timeout': settings.LISTING_CACHE_TIMEOUT,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@read_from_replica
+@listing_condition(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = page_obj_gen(request, posts)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = counters.stats_for(author)
+    posts = author.posts.for_listing()
+    page_obj = _lazy_page(request, posts, count=stats.posts_count)
     title = f'Профайл пользователя {author.get_full_name()}'
     # if request.user.is_authenticated:
     #     following = Follow.objects.filter(
@@ -55,14 +100,41 @@ def profile(request, username):
         'page_obj': page_obj,
         'title': title,
         'following': following,
+        'listing_key': caching.listing_key(
+            request, caching.author_scope(author.pk)
+        ),
+        'listing_timeout': settings.LISTING_CACHE_TIMEOUT,
     }
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts, paginator_class = search_posts(query)
+    page_obj = _lazy_page(request, posts, paginator_class=paginator_class)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+        'title': f'Поиск: {query}' if query else 'Поиск',
+        'paginator_query': urlencode({'q': query}) + '&',
+        # Любая правка поста сбрасывает INDEX, а с ним и выдачу поиска.
+        'listing_key': caching.listing_key(request, caching.INDEX),
+        'listing_timeout': settings.LISTING_CACHE_TIMEOUT,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@read_from_replica
+@listing_condition(post_detail_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    counters.stats_for(post.author)
+    thumbnails.attach([post])
+    caching.attach_versions([post])
     title = f'Пост {post.text[:30]}'
-    comments = post.comments.all()
+    comments = comments_page_gen(request, post)
     form = CommentForm(request.POST or None)
     context = {
         'form': form,
@@ -73,16 +145,42 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    comments = comments_page_gen(request, post)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
+@bounded_uploads
 def post_create(request):
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None
+        files=request.FILES or None,
+        oversized=request.oversized_uploads,
     )
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.enqueue(post)
         return redirect('posts:profile', username=request.user)
     title = 'Новый пост'
     context = {
@@ -94,6 +192,7 @@ def post_create(request):
 
 
 @login_required
+@bounded_uploads
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
@@ -101,10 +200,13 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        oversized=request.oversized_uploads,
     )
     if form.is_valid():
         post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(post)
         return redirect('posts:post_detail', post_id=post_id)
     title = 'Редактирование поста'
     context = {
@@ -128,15 +230,56 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def post_changes(request):
+    """Посты, изменённые после ?since=, для инкрементальной обработки.
+
+    Клиент передаёт в следующий запрос since и after из ответа и так
+    получает только новые изменения, не перечитывая всю таблицу.
+    since без часового пояса считается временем TIME_ZONE. Удалённые
+    посты в ленту не попадают, о чём говорит deletions_reported: false
+    в ответе: их клиенту нужно сверять отдельно.
+    """
+    try:
+        since = parse_datetime(request.GET.get('since', ''))
+    except ValueError:
+        since = None
+    if since is None:
+        return HttpResponseBadRequest('Укажите since в формате ISO 8601')
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    after = request.GET.get('after')
+    if after is not None and not after.isdigit():
+        return HttpResponseBadRequest('after должен быть числом')
+    posts = list(Post.objects.changed_since(
+        since, after_pk=after and int(after)
+    ).values(
+        'pk', 'text', 'group_id', 'author_id', 'pub_date', 'updated_at',
+        'comments_count',
+    )[:settings.CHANGES_BATCH_SIZE])
+    next_params = None
+    if posts:
+        next_params = {
+            'since': posts[-1]['updated_at'].isoformat(),
+            'after': posts[-1]['pk'],
+        }
+    return JsonResponse({
+        'posts': posts,
+        'next': next_params,
+        'deletions_reported': False,
+    })
+
+
+@read_from_replica
 @login_required
 def follow_index(request):
-    followings = Follow.objects.filter(
-        user=request.user
-    ).values_list('author')
-    posts = Post.objects.filter(author_id__in=followings)
-
+    # Лента читается раньше версий карточек, поэтому узнаём заранее,
+    # не изменились ли посты только что (тогда читаем из default).
+    caching.get_versions([caching.ALL, caching.INDEX])
+    posts, sources = timeline.feed(request.user)
     title = 'Посты избранных авторов'
-    page_obj = page_obj_gen(request, posts)
+    page_obj = page_obj_gen(request, posts, sources, **timeline.FEED_KEY)
+    thumbnails.attach(page_obj)
+    caching.attach_versions(page_obj)
     context = {
         'page_obj': page_obj,
         'title': title,
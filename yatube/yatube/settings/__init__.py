@@ -0,0 +1,25 @@
+"""Профиль настроек выбирается переменной окружения YATUBE_ENV.
+
+dev (по умолчанию) — локальная разработка и тесты, prod — боевой
+сервер (нужен YATUBE_SECRET_KEY), bench — prod для нагрузочных замеров
+на локальной машине. Общие для prod и bench настройки лежат в server.
+Профиль можно задать и напрямую: DJANGO_SETTINGS_MODULE=yatube.settings.prod
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+ENVIRONMENT = os.environ.get('YATUBE_ENV', 'dev')
+
+if ENVIRONMENT == 'dev':
+    from .dev import *  # noqa: F401,F403
+elif ENVIRONMENT == 'prod':
+    from .prod import *  # noqa: F401,F403
+elif ENVIRONMENT == 'bench':
+    from .bench import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(
+        f'Неизвестный профиль настроек YATUBE_ENV={ENVIRONMENT}, '
+        'ожидается dev, prod или bench'
+    )
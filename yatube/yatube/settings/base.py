@@ -0,0 +1,270 @@
+"""
+Django settings for yatube project: общие для всех профилей.
+
+Generated by 'django-admin startproject' using Django 2.2.19.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/2.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/2.2/ref/settings/
+"""
+
+import copy
+import os
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'd+h)82w+vpd@uu^xhruz69losypngbxvhwfa)v9*p!i65w!pxc'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    'localhost',
+    '127.0.0.1',
+    '[::1]',
+    'testserver',
+    'www.elvir.pythonanywhere.com',
+    'elvir.pythonanywhere.com',
+]
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'posts.apps.PostsConfig',
+    'users.apps.UsersConfig',
+    'core.apps.CoreConfig',
+    'about.apps.AboutConfig',
+    'sorl.thumbnail',
+    # 'debug_toolbar',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    # Снаружи сессий, чтобы видеть и запись сессии после входа
+    'core.replicas.ReplicaPinMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # 'debug_toolbar.middleware.DebugToolbarMiddleware',
+]
+
+ROOT_URLCONF = 'yatube.urls'
+
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [TEMPLATES_DIR],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'core.context_processors.year.year',
+            ],
+        },
+    },
+]
+
+# Скомпилировать все шаблоны при старте WSGI-приложения (core.warmup).
+# Имеет смысл только с cached loader, см. settings/server.py.
+TEMPLATE_WARMUP = False
+
+WSGI_APPLICATION = 'yatube.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        # Обычный sqlite3 плюс PRAGMA из OPTIONS и BEGIN IMMEDIATE
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами: PRAGMA и кеш страниц
+        # не приходится настраивать и прогревать заново.
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'pragmas': {
+                # Читатели не ждут писателя, писатель не ждёт читателей
+                'journal_mode': 'wal',
+                # В WAL fsync только на чекпоинтах, без риска порчи базы
+                'synchronous': 'normal',
+                'busy_timeout': 5000,
+                'mmap_size': 256 * 2 ** 20,
+                # Отрицательное значение — размер в КиБ
+                'cache_size': -64 * 2 ** 10,
+                'temp_store': 'memory',
+            },
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+# Реплики только для чтения лент (core.replicas.read_from_replica).
+# YATUBE_DB_REPLICAS=2 добавит replica1 и replica2 — копии db.sqlite3,
+# которые обновляет manage.py sync_replicas.
+DATABASE_REPLICAS = [
+    f'replica{number}'
+    for number in range(1, int(os.environ.get('YATUBE_DB_REPLICAS', 0)) + 1)
+]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = copy.deepcopy(DATABASES['default'])
+    DATABASES[alias]['NAME'] = os.path.join(BASE_DIR, f'db.{alias}.sqlite3')
+    DATABASES[alias]['OPTIONS']['pragmas']['query_only'] = 1
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# После своей записи пользователь столько секунд читает из default
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = 'replica_pin'
+
+
+# Password validation
+# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/2.2/topics/i18n/
+
+LANGUAGE_CODE = 'ru'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/2.2/howto/static-files/
+
+STATIC_URL = '/static/'
+
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# Сюда collectstatic собирает статику для раздачи в prod
+STATIC_ROOT = os.path.join(BASE_DIR, 'static_root')
+# Раздавать STATIC_ROOT из wsgi.py (core.staticfiles), минуя Django
+SERVE_STATIC = False
+
+LOGIN_URL = 'users:login'
+LOGIN_REDIRECT_URL = 'posts:index'
+# LOGOUT_REDIRECT_URL = 'users:logout'
+
+#  подключаем движок filebased.EmailBackend
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# указываем директорию, в которую будут складываться файлы писем
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+POST_COUNT = 10
+COMMENT_COUNT = 20
+# Сколько изменённых постов отдаёт за раз posts:post_changes
+CHANGES_BATCH_SIZE = 100
+# Показывать примерное число страниц в ленте (COUNT(*) кешируется)
+PAGINATOR_APPROXIMATE_TOTALS = False
+PAGINATOR_COUNT_TIMEOUT = 60
+
+# Лента подписок хранится материализованной (fan-out-on-write)
+TIMELINE_LENGTH = 800
+TIMELINE_BATCH_SIZE = 500
+# Авторы с числом подписчиков больше порога подмешиваются в ленту при чтении;
+# None - раздавать посты всех авторов при записи
+TIMELINE_CELEBRITY_THRESHOLD = 1000
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Ленты сбрасываются сигналами при изменении постов и комментариев,
+# поэтому их можно держать в кеше долго
+LISTING_CACHE_TIMEOUT = 60 * 60 * 6
+# Ссылки ?page=N кешируются только для первых страниц, глубже лента
+# рендерится заново: иначе перебор номеров вытеснял бы нужные фрагменты
+LISTING_CACHE_PAGES = 20
+# Фрагменты лент пересчитывает один запрос, пока остальные отдают
+# прошлую версию (posts.caching.get_or_compute). Столько секунд держится
+# блокировка пересчёта; BETA > 1 — пересчитывать заранее охотнее.
+CACHE_LOCK_TIMEOUT = 10
+CACHE_EARLY_EXPIRY_BETA = 1.0
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+# Общий для всех процессов кеш в файле SQLite: фрагменты и версии лент
+# не дублируются в каждом воркере, и сброс версии виден всем. Включён
+# в prod; в остальных профилях — если задан YATUBE_CACHE_PATH.
+# Счётчики попаданий — manage.py cache_stats.
+SHARED_CACHE = {
+    'BACKEND': 'core.backends.cache.SQLiteCache',
+    'LOCATION': os.environ.get(
+        'YATUBE_CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')
+    ),
+    'OPTIONS': {
+        'MAX_ENTRIES': 50000,
+        'MAX_BYTES': 256 * 2 ** 20,
+    },
+}
+if os.environ.get('YATUBE_CACHE_PATH'):
+    CACHES['default'] = SHARED_CACHE
+
+# Размеры миниатюр постов: имя -> (геометрия, опции sorl-thumbnail)
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Каждый размер дополнительно нарезается этими ширинами для srcset
+# и кодируется в каждом формате, который умеет Pillow. Последний
+# формат отдаётся браузерам, не понимающим остальные.
+POST_THUMBNAIL_WIDTHS = (480, 960, 1440)
+POST_THUMBNAIL_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+POST_THUMBNAIL_QUALITY = {'AVIF': 60, 'WEBP': 75, 'JPEG': 82}
+# Исходники больше этого размера по длинной стороне уменьшаются
+# при загрузке
+POST_IMAGE_MAX_SIDE = 2560
+# Ограничения на загружаемые картинки: проверяются до полного
+# декодирования, чтобы «бомбы» не раздували память воркера
+POST_IMAGE_MAX_BYTES = 10 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+# Генерировать миниатюры в фоновых потоках, а в шаблоне до готовности
+# показывать заглушку. В dev миниатюры делаются прямо в запросе.
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+# Свой backend нужен ради расширения файлов AVIF
+THUMBNAIL_BACKEND = 'posts.thumbnails.PostThumbnailBackend'
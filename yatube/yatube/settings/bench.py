@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+from .server import *  # noqa: F401,F403
+from .server import SECRET_KEY, SHARED_CACHE
+
+# Замерам на локальной машине настоящий ключ не нужен
+SECRET_KEY = os.environ.get('YATUBE_SECRET_KEY', SECRET_KEY)
+
+# Замеры запускаются без collectstatic
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+SERVE_STATIC = False
+
+# Бенчмарки сбрасывают версии лент, боевой кеш им не трогать
+CACHES = {'default': dict(SHARED_CACHE, LOCATION=os.path.join(
+    tempfile.gettempdir(), 'yatube-bench-cache.sqlite3'
+))}
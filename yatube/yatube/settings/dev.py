@@ -0,0 +1,10 @@
+from .base import *  # noqa: F401,F403
+
+DEBUG = True
+
+# Миниатюры делаются прямо в запросе: так проще отлаживать и тестировать
+THUMBNAIL_ASYNC = False
+
+INTERNAL_IPS = [
+    '127.0.0.1',
+]
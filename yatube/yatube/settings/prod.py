@@ -0,0 +1,12 @@
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .server import *  # noqa: F401,F403
+
+# Ключ из репозитория годится только для разработки и замеров
+SECRET_KEY = os.environ.get('YATUBE_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured(
+        'В профиле prod нужно задать YATUBE_SECRET_KEY'
+    )
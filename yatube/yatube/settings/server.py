@@ -0,0 +1,38 @@
+# Общее для prod и bench; отдельным профилем не выбирается.
+import copy
+
+from .base import *  # noqa: F401,F403
+from .base import DATABASES, MIDDLEWARE, SHARED_CACHE, TEMPLATES
+
+DEBUG = False
+
+# Словари base меняем только в копиях: профили импортируются в одном
+# процессе (например, в тестах), и правки не должны протекать в dev.
+DATABASES = copy.deepcopy(DATABASES)
+for database in DATABASES.values():
+    # Соединение, PRAGMA и кеш страниц SQLite живут между запросами
+    database['CONN_MAX_AGE'] = 600
+
+# Шаблоны читаются и разбираются один раз на процесс, а не на каждый
+# запрос. С явными loaders APP_DIRS нужно выключить.
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+TEMPLATE_WARMUP = True
+
+# GZip до остальных middleware, чтобы сжимать уже готовый ответ
+MIDDLEWARE = [MIDDLEWARE[0], 'django.middleware.gzip.GZipMiddleware'] + (
+    MIDDLEWARE[1:]
+)
+
+# Имена файлов с хешем содержимого и сжатые копии .gz/.br после
+# collectstatic; отдаются с Cache-Control: immutable
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
+SERVE_STATIC = True
+
+CACHES = {'default': SHARED_CACHE}
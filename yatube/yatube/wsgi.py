@@ -14,3 +14,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.TEMPLATE_WARMUP:
+    from core.warmup import warm_templates
+
+    warm_templates()
+
+if settings.SERVE_STATIC:
+    from core.staticfiles import StaticFilesApplication
+
+    application = StaticFilesApplication(application)